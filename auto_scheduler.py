@@ -1,22 +1,39 @@
 import os
-import csv
+import io
+import re
+import json
 import base64
 import datetime
 import time
 import random
+import sqlite3
 import hashlib
+import argparse
+import threading
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
+from image_utils import open_for_width, format_load_stats, prepare_ahead
+from hash_index import HashIndex, hash_file
+from near_duplicates import NearDuplicateIndex, dhash_many
+from run_journal import RunJournal
 from mistralai import Mistral
 from dotenv import load_dotenv
 
 # --- CONFIGURATION ---
 load_dotenv()
 API_KEY = os.environ.get("API_KEY") 
+MISTRAL_SERVER_URL = os.environ.get("MISTRAL_SERVER_URL")   # Unset = the real API; see benchmarks/fake_mistral_server.py
 LINK_URL = "https://www.anione.me/en?ref_code=DailyMakima"
 IMAGES_FOLDER = "images/makima"
 OUTPUT_CSV = "makima_data/outputs/postpone_upload.csv"
 SEQUENCE_FILE = "makima_data/.sequence_id"      
 DATE_TRACKER_FILE = "makima_data/.last_date"    
+HASH_INDEX_FILE = "makima_data/.hash_index.sqlite"   # Content hashes of files already seen (path, size, mtime)
+HASH_ALGORITHM = "blake2b"   # "md5" = the digests older runs stored
+NEAR_DUPLICATE_INDEX_FILE = "makima_data/.near_duplicates.sqlite"   # dHashes of every image ever posted
+NEAR_DUPLICATE_DISTANCE = 6  # Max differing dHash bits (of 64) to treat a new file as already posted
 PLATFORM_PREFIX = "twitter"
 
 # Account Name (No '@')
@@ -35,6 +52,32 @@ JITTER_MINUTES_MAX = 25
 # Optimization Settings
 MAX_FILE_SIZE_MB = 4.5
 TARGET_WIDTH = 1080
+PREP_WORKERS = 4      # Processes optimizing upcoming images while captions are in flight (1 = inline)
+PREP_LOOKAHEAD = 8    # Images optimized ahead of the captioning
+
+# Captioning Settings
+CAPTION_MODEL = "pixtral-12b-2409"
+CAPTION_WORKERS = 4           # Caption requests in flight at once
+CAPTION_RATE_PER_SEC = 1.0    # Sustained API requests per second (token bucket refill rate)
+CAPTION_BURST = 4             # Requests that may go out back-to-back before the rate applies
+CAPTION_MAX_RETRIES = 5       # Retries per request on 429 / 5xx / connection errors
+BACKOFF_BASE_SECONDS = 2.0    # First backoff, doubled on every retry (with jitter)
+BACKOFF_MAX_SECONDS = 60.0
+CAPTION_ATTEMPTS = 3          # Captions asked per image while they repeat recent ones
+FALLBACK_CAPTION = "makima 🩸"
+CAPTION_BATCH_SIZE = 4        # Images packed into one request (1 = one request per image, as before)
+
+# Vision Thumbnails: the API gets a small re-encoded copy, the CSV keeps the original file
+VISION_MAX_SIDE = 1024               # Longest side sent to the model
+VISION_FORMAT = "JPEG"               # "JPEG" or "WEBP"
+VISION_QUALITY = 85
+VISION_CACHE_DIR = "makima_data/.vision_cache"
+
+# Caption Cache: captions already paid for, keyed by image content + SYSTEM_PROMPT + model
+CAPTION_CACHE_FILE = "makima_data/.caption_cache.sqlite"
+CAPTION_CACHE_MAX_ENTRIES = 5000     # Least recently used captions beyond this are evicted
+CAPTION_CACHE_MAX_AGE_DAYS = 180     # Captions not used for this long are evicted
+FORCE_REFRESH_CAPTIONS = False       # True (or --refresh-captions) = ask the API again, overwrite the cache
 
 # --- HASHTAG STRATEGY ---
 TAGS_CHARACTER = ["#makima", "#マキマ"] 
@@ -61,6 +104,14 @@ Rules:
 6. Output ONLY the text and emoji.
 """
 
+# Batched requests: the same rules, applied to each of N numbered images in one call
+BATCH_PROMPT = """
+You will receive {count} images, numbered 1 to {count} in order.
+Caption EACH image separately, following the rules above.
+Reply with JSON only, in exactly this shape:
+{{"captions": [{{"image": 1, "caption": "..."}}, ..., {{"image": {count}, "caption": "..."}}]}}
+"""
+
 # --- ROBUST TRACKING FUNCTIONS ---
 
 def get_next_sequence_number():
@@ -106,7 +157,7 @@ def save_last_schedule(date_obj):
 # --- UTILS ---
 
 def get_image_hash(image_path):
-    with open(image_path, "rb") as f: return hashlib.md5(f.read()).hexdigest()
+    return hash_file(image_path, HASH_ALGORITHM)
 
 def get_file_size_mb(file_path):
     return os.path.getsize(file_path) / (1024 * 1024)
@@ -115,9 +166,14 @@ def optimize_image(image_path):
     if get_file_size_mb(image_path) < MAX_FILE_SIZE_MB: return image_path 
     print(f"   ⚠️ Optimizing large file: {os.path.basename(image_path)}...")
     try:
-        with Image.open(image_path) as img:
+        # Decodes at reduced scale when the source is far wider than TARGET_WIDTH
+        img, load_stats = open_for_width(image_path, TARGET_WIDTH)
+        if load_stats["method"] != "full":
+            print(f"      📉 {format_load_stats(load_stats)}")
+        with img:
             if img.mode in ("RGBA", "P"): img = img.convert("RGB")
-            aspect_ratio = img.height / img.width
+            orig_w, orig_h = load_stats["original"]
+            aspect_ratio = orig_h / orig_w
             new_height = int(TARGET_WIDTH * aspect_ratio)
             img = img.resize((TARGET_WIDTH, new_height), Image.Resampling.LANCZOS)
             new_path = os.path.splitext(image_path)[0] + ".jpg"
@@ -128,18 +184,95 @@ def optimize_image(image_path):
         print(f"   ❌ Error optimizing image: {e}")
         return image_path
 
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+def planned_path(filename):
+    """Where a renamed image is now; after an interrupted run it may already be the optimized .jpg."""
+    path = os.path.join(IMAGES_FOLDER, filename)
+    optimized = os.path.splitext(path)[0] + ".jpg"
+    if not os.path.exists(path) and os.path.exists(optimized):
+        return optimized
+    return path
+
+# --- VISION THUMBNAILS ---
+
+VISION_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+VISION_STATS = {"images": 0, "cached": 0, "original_bytes": 0, "sent_bytes": 0}
+_vision_lock = threading.Lock()
+
+def build_vision_thumbnail(image_path):
+    """Small RGB re-encode of image_path for the vision model. Returns the encoded bytes."""
+    with Image.open(image_path) as img:
+        # thumbnail() lets JPEGs decode at reduced scale (draft) before the LANCZOS pass
+        img.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.Resampling.LANCZOS)
+        if img.mode != "RGB": img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, VISION_FORMAT, quality=VISION_QUALITY)
+    return buffer.getvalue()
+
+def vision_data_url(image_path, image_hash):
+    """
+    data: URL of the cached thumbnail for image_hash (built on first use), with the MIME type
+    that matches its bytes. Falls back to the original file, labeled by its real format.
+    """
+    ext = VISION_FORMAT.lower().replace("jpeg", "jpg")
+    thumb_path = os.path.join(VISION_CACHE_DIR, f"{image_hash}_{VISION_MAX_SIDE}_q{VISION_QUALITY}.{ext}")
+    cached = os.path.exists(thumb_path)
+    try:
+        if cached:
+            with open(thumb_path, "rb") as f: data = f.read()
+            # mtime doubles as last use, so prune_vision_cache keeps thumbnails still being sent
+            try: os.utime(thumb_path)
+            except OSError: pass
+        else:
+            data = build_vision_thumbnail(image_path)
+            os.makedirs(VISION_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f: f.write(data)
+            os.replace(tmp_path, thumb_path)
+        mime = VISION_MIME_TYPES[VISION_FORMAT]
+    except Exception as e:
+        print(f"   ⚠️ Thumbnail failed ({e}), sending the original file")
+        with open(image_path, "rb") as f: data = f.read()
+        with Image.open(image_path) as img: mime = Image.MIME.get(img.format, "image/jpeg")
+
+    with _vision_lock:
+        VISION_STATS["images"] += 1
+        VISION_STATS["cached"] += cached
+        VISION_STATS["original_bytes"] += os.path.getsize(image_path)
+        VISION_STATS["sent_bytes"] += len(data)
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+def prune_vision_cache(max_age_days=CAPTION_CACHE_MAX_AGE_DAYS):
+    """Deletes thumbnails not used for max_age_days (their captions are cached anyway)."""
+    if not os.path.isdir(VISION_CACHE_DIR): return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in os.scandir(VISION_CACHE_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError: pass
+    return removed
+
+def vision_stats_summary():
+    stats = VISION_STATS
+    return (f"🖼️ Vision thumbnails: {stats['images']} sent ({stats['cached']} from cache), "
+            f"{stats['sent_bytes'] / (1024 * 1024):.1f} MB instead of {stats['original_bytes'] / (1024 * 1024):.1f} MB")
 
 def rename_and_prepare_files():
     start_index = get_next_sequence_number()
     all_files = [f for f in os.listdir(IMAGES_FOLDER) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
     
+    # Only new or changed files are actually hashed; the rest come from the index
+    hash_index = HashIndex(HASH_INDEX_FILE, HASH_ALGORITHM)
+    hash_index.prune(IMAGES_FOLDER, all_files)
+    # One parallel pass over everything not indexed yet (new drops are usually most of it)
+    file_hashes = hash_index.get_many([os.path.join(IMAGES_FOLDER, f) for f in all_files])
+    
     existing_hashes = set()
     for f in all_files:
         if f.startswith(f"{PLATFORM_PREFIX}_img_"):
-            existing_hashes.add(get_image_hash(os.path.join(IMAGES_FOLDER, f)))
+            existing_hashes.add(file_hashes[os.path.join(IMAGES_FOLDER, f)])
             
     new_files = []
     
@@ -147,6 +280,15 @@ def rename_and_prepare_files():
         if not f.startswith(f"{PLATFORM_PREFIX}_img_"):
             new_files.append(f)
 
+    # Perceptual check against the whole posted history, so re-exports and resizes are caught
+    # too. Posted files the index hasn't seen yet (e.g. from before it existed) are added first.
+    near_index = NearDuplicateIndex(NEAR_DUPLICATE_INDEX_FILE)
+    unindexed = [f for f in all_files if f.startswith(f"{PLATFORM_PREFIX}_img_")
+                 and os.path.splitext(f)[0] not in near_index.known]
+    dhashes = dhash_many([os.path.join(IMAGES_FOLDER, f) for f in unindexed + new_files])
+    for f in unindexed:
+        near_index.add(os.path.splitext(f)[0], dhashes[os.path.join(IMAGES_FOLDER, f)])
+
     random.shuffle(new_files)
     
     renamed_files_list = []
@@ -156,111 +298,417 @@ def rename_and_prepare_files():
     for filename in new_files:
         full_path = os.path.join(IMAGES_FOLDER, filename)
         
-        img_hash = get_image_hash(full_path)
+        img_hash = file_hashes[full_path]
         if img_hash in existing_hashes:
             print(f"   🚫 Skipping Duplicate Image: {filename}")
             continue 
         
+        match = near_index.find(dhashes[full_path], NEAR_DUPLICATE_DISTANCE)
+        if match is not None:
+            print(f"   🚫 Skipping Near-Duplicate: {filename} (looks like {match[0]}, {match[1]} bits apart)")
+            continue
+        
         ext = os.path.splitext(filename)[1]
         new_name = f"{PLATFORM_PREFIX}_img_{current_index:03d}{ext}"
         new_path = os.path.join(IMAGES_FOLDER, new_name)
         
         os.rename(full_path, new_path)
+        hash_index.rename(full_path, new_path)
+        near_index.add(os.path.splitext(new_name)[0], dhashes[full_path])
         renamed_files_list.append((new_name, current_index))
         existing_hashes.add(img_hash)
         current_index += 1
     
     if current_index > start_index: update_sequence_number(current_index - 1)
+    print(hash_index.summary())
+    print(near_index.summary())
+    hash_index.close()
+    near_index.close()
     return renamed_files_list
 
+# --- CAPTIONING ---
+
+class TokenBucket:
+    """Thread-safe token bucket. acquire() blocks until another request may be sent."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """After a 429 every worker holds off, not just the one that got it."""
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+class CaptionCache:
+    """SQLite map of (image hash, prompt version, model) -> caption. Thread-safe."""
+
+    def __init__(self, path, model, prompt):
+        self.model = model
+        self.prompt_version = hashlib.sha1(prompt.strip().encode("utf-8")).hexdigest()[:12]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Workers look captions up from their own threads (guarded by the lock)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS captions ("
+            "image_hash TEXT NOT NULL, prompt_version TEXT NOT NULL, model TEXT NOT NULL, "
+            "caption TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (image_hash, prompt_version, model))"
+        )
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_hash, refresh=False):
+        """Cached caption or None. refresh=True always misses (the new caption then overwrites)."""
+        with self.lock:
+            if refresh:
+                self.misses += 1
+                return None
+            key = (image_hash, self.prompt_version, self.model)
+            row = self.conn.execute(
+                "SELECT caption FROM captions WHERE image_hash = ? AND prompt_version = ? AND model = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE captions SET last_used = ? WHERE image_hash = ? AND prompt_version = ? AND model = ?",
+                (time.time(),) + key)
+            return row[0]
+
+    def put(self, image_hash, caption):
+        with self.lock:
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO captions (image_hash, prompt_version, model, caption, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (image_hash, self.prompt_version, self.model, caption, now, now),
+            )
+            # Commit right away: surviving a crash halfway through is the whole point
+            self.conn.commit()
+
+    def evict(self, max_entries=CAPTION_CACHE_MAX_ENTRIES, max_age_days=CAPTION_CACHE_MAX_AGE_DAYS):
+        """Drops captions unused for max_age_days, then the least recently used beyond max_entries."""
+        with self.lock:
+            cutoff = time.time() - max_age_days * 86400
+            removed = self.conn.execute("DELETE FROM captions WHERE last_used < ?", (cutoff,)).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM captions WHERE rowid NOT IN "
+                "(SELECT rowid FROM captions ORDER BY last_used DESC LIMIT ?)", (max_entries,)
+            ).rowcount
+            self.conn.commit()
+            return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def summary(self):
+        return f"💾 Caption cache: {self.hits} reused, {self.misses} asked from the API"
+
+# --- CAPTION REQUESTS ---
+CAPTION_STATS = {"batch_requests": 0, "batched": 0, "single": 0, "failed_batches": 0}
+_caption_lock = threading.Lock()
+
+def count_captions(**amounts):
+    with _caption_lock:
+        for key, amount in amounts.items():
+            CAPTION_STATS[key] += amount
+
+def caption_stats_summary():
+    stats = CAPTION_STATS
+    failed = f", {stats['failed_batches']} batches failed" if stats["failed_batches"] else ""
+    return (f"📦 Captions: {stats['batched']} from {stats['batch_requests']} batched requests, "
+            f"{stats['single']} asked one by one{failed}")
+
+def retry_delay(error, attempt):
+    """Retry-After if the API sent one, else exponential backoff with jitter."""
+    response = getattr(error, "raw_response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        if header: return min(BACKOFF_MAX_SECONDS, float(header))
+    except ValueError: pass
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def clean_caption(text):
+    return text.strip().lower().replace(".", "").replace('"', '')
+
+def complete_with_retry(client, bucket, content, **kwargs):
+    """One chat completion, rate limited. Retries 429 / 5xx / network errors with backoff."""
+    for attempt in range(CAPTION_MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            chat_response = client.chat.complete(
+                model=CAPTION_MODEL,
+                messages=[{"role": "user", "content": content}],
+                **kwargs
+            )
+            return chat_response.choices[0].message.content
+        except Exception as api_error:
+            status = getattr(api_error, "status_code", None)
+            # Other 4xx (bad request, auth...) won't get better by asking again
+            if attempt == CAPTION_MAX_RETRIES or (status is not None and status != 429 and status < 500):
+                raise
+            delay = retry_delay(api_error, attempt)
+            if status == 429: bucket.pause(delay)
+            print(f"   ⚠️ API Error ({api_error}). Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def request_caption(client, bucket, image_url):
+    """One caption for one image."""
+    content = [{"type": "text", "text": SYSTEM_PROMPT}, {"type": "image_url", "image_url": image_url}]
+    return clean_caption(complete_with_retry(client, bucket, content))
+
+def parse_batch_captions(text, count):
+    """
+    Captions from a batched reply, in image order. Entries that are missing, empty,
+    duplicated or not 1-2 words (+ emoji) come back as None and get asked one by one.
+    """
+    captions = [None] * count
+    # Some replies still wrap the JSON in a ```json fence
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return captions
+    entries = data.get("captions") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return captions
+
+    for position, entry in enumerate(entries):
+        if isinstance(entry, str):
+            index, caption = position, entry
+        elif isinstance(entry, dict):
+            index, caption = entry.get("image", position + 1), entry.get("caption")
+            if not isinstance(index, int) or isinstance(index, bool):
+                continue
+            index -= 1
+        else:
+            continue
+        if not isinstance(caption, str) or not 0 <= index < count or captions[index] is not None:
+            continue
+        caption = clean_caption(caption)
+        if caption and "\n" not in caption and len(caption.split()) <= 4:
+            captions[index] = caption
+    return captions
+
+def request_captions_batch(client, bucket, image_urls):
+    """Captions for several images from one request (None where the reply was unusable)."""
+    content = [{"type": "text", "text": SYSTEM_PROMPT + BATCH_PROMPT.format(count=len(image_urls))}]
+    for number, image_url in enumerate(image_urls, 1):
+        content.append({"type": "text", "text": f"Image {number}:"})
+        content.append({"type": "image_url", "image_url": image_url})
+    reply = complete_with_retry(client, bucket, content, response_format={"type": "json_object"})
+    return parse_batch_captions(reply, len(image_urls))
+
+def caption_group(client, bucket, cache, image_paths, refresh=False):
+    """
+    Worker: first caption for a group of optimized images, from the cache when possible.
+    Uncached images share one batched request; any the reply doesn't cover are asked alone.
+    Returns one (final_path, image_hash, caption or None) per path, or the exception
+    that image failed with (image_paths may already hold one from the optimize stage).
+    """
+    results = []
+    for final_path in image_paths:
+        if isinstance(final_path, Exception):
+            results.append(final_path)
+            continue
+        try:
+            image_hash = get_image_hash(final_path)
+            results.append([final_path, image_hash, cache.get(image_hash, refresh)])
+        except Exception as e:
+            results.append(e)
+
+    pending = [item for item in results if isinstance(item, list) and item[2] is None]
+    if len(pending) > 1:
+        try:
+            captions = request_captions_batch(client, bucket, [vision_data_url(p, h) for p, h, _ in pending])
+        except Exception as api_error:
+            print(f"   ⚠️ Batch API Error ({api_error}), captioning {len(pending)} images one by one.")
+            captions = [None] * len(pending)
+        for item, caption in zip(pending, captions):
+            item[2] = caption
+        batched = sum(caption is not None for caption in captions)
+        # Only replies that gave captions count as batched requests, or failures would drag
+        # the captions-per-request figure down
+        if batched:
+            count_captions(batch_requests=1, batched=batched)
+        else:
+            count_captions(failed_batches=1)
+
+    for item in pending:
+        if item[2] is None:
+            try:
+                item[2] = request_caption(client, bucket, vision_data_url(item[0], item[1]))
+            except Exception as api_error:
+                print(f"   ⚠️ API Error ({api_error}) on {os.path.basename(item[0])}.")
+                continue
+            count_captions(single=1)
+        cache.put(item[1], item[2])
+    return [tuple(item) if isinstance(item, list) else item for item in results]
+
+def pick_caption(client, bucket, image_path, image_hash, raw, recent_captions):
+    """
+    Runs in posting order, so the recent_captions check sees exactly the captions before it.
+    A repeat is re-asked (CAPTION_ATTEMPTS in total); if nothing usable comes back the
+    fallback caption is used, as before.
+    """
+    attempts = 1
+    while raw is not None and raw in recent_captions and attempts < CAPTION_ATTEMPTS:
+        print(f"   ⚠️ Duplicate caption '{raw}'. shuffling...")
+        try:
+            raw = request_caption(client, bucket, vision_data_url(image_path, image_hash))
+        except Exception as api_error:
+            print(f"   ⚠️ API Error ({api_error}).")
+            raw = None
+        attempts += 1
+    if raw is None or raw in recent_captions:
+        return FALLBACK_CAPTION
+    return raw
+
 def generate_smart_hashtags():
     return f"{random.choice(TAGS_CHARACTER)} {random.choice(TAGS_SERIES)} {random.choice(TAGS_NICHE)}"
 
 # --- MAIN LOOP ---
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rename new images, caption them and write the upload CSV.")
+    parser.add_argument("--refresh-captions", action="store_true", default=FORCE_REFRESH_CAPTIONS,
+                        help="Ignore cached captions and ask the API again (the cache is updated)")
+    parser.add_argument("--batch-size", type=int, default=CAPTION_BATCH_SIZE,
+                        help=f"Images captioned per API request (default: {CAPTION_BATCH_SIZE}, 1 = one per request)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
     if not os.path.exists(IMAGES_FOLDER):
         print(f"Error: Folder '{IMAGES_FOLDER}' not found.")
         return
 
-    client = Mistral(api_key=API_KEY)
-    
-    files_with_days = rename_and_prepare_files()
+    client = Mistral(api_key=API_KEY, server_url=MISTRAL_SERVER_URL)
     
-    if not files_with_days:
-        print("No new files to process!")
-        return
+    # A run that crashed halfway is finished first: its files are already renamed and its
+    # committed rows are kept, so only the rest gets optimized and captioned
+    journal = RunJournal(OUTPUT_CSV)
+    if journal.load():
+        print(f"♻️ Resuming interrupted run: {len(journal.entries)}/{len(journal.plan)} rows already done")
+    else:
+        files_with_days = rename_and_prepare_files()
+        
+        if not files_with_days:
+            print("No new files to process!")
+            return
+        journal.begin(files_with_days, get_start_schedule())
 
-    current_baseline = get_start_schedule()
-    recent_captions = [] 
+    files_with_days = journal.pending()
+    current_baseline = journal.next_slot()
+    recent_captions = [entry["caption"] for entry in journal.entries if entry.get("caption")][-5:]
     headers = ["account", "text", "gallery", "post_at", "community", "share_with_followers", "auto_retweet", "retweet_by", "remove_after", "remove_min_likes", "thread_reply"]
     
     print("\n--- Starting Content Factory ---")
     
-    # 1. UTF-8-SIG for correct Emoji display
-    # 2. QUOTE_MINIMAL keeps the file cleaner (closer to the example), quoting only when necessary
-    with open(OUTPUT_CSV, mode='w', newline='', encoding='utf-8-sig') as file:
-        writer = csv.writer(file, quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(headers)
-        
-        for filename, day_number in files_with_days:
-            full_path = os.path.join(IMAGES_FOLDER, filename)
-            final_path = optimize_image(full_path)
-            final_filename = os.path.basename(final_path)
-            print(f"Processing Day {day_number}: {final_filename}...")
-            
+    # Images are optimized in a process pool (PREP_LOOKAHEAD ahead) and captioned
+    # CAPTION_WORKERS groups at a time (--batch-size images per request), but rows are
+    # committed strictly in day order below, so recent_captions dedup and the schedule
+    # behave exactly as one-by-one.
+    bucket = TokenBucket(CAPTION_RATE_PER_SEC, CAPTION_BURST)
+    cache = CaptionCache(CAPTION_CACHE_FILE, CAPTION_MODEL, SYSTEM_PROMPT)
+    batch_size = max(1, args.batch_size)
+    groups = [files_with_days[i:i + batch_size] for i in range(0, len(files_with_days), batch_size)]
+    optimized = prepare_ahead(optimize_image, [planned_path(filename) for filename, _ in files_with_days],
+                              PREP_WORKERS, PREP_LOOKAHEAD)
+    pool = ThreadPoolExecutor(max_workers=CAPTION_WORKERS)
+    futures = deque()
+    upcoming = iter(groups)
+    
+    # Rows go to the journal as they are done; the CSV is written once everything is in
+    with pool:
+        for group in groups:
+            # Keep every caption worker busy (plus one group queued) ahead of this row
+            for next_group in islice(upcoming, CAPTION_WORKERS + 1 - len(futures)):
+                image_paths = [next(optimized) for _ in next_group]
+                futures.append(pool.submit(caption_group, client, bucket, cache, image_paths, args.refresh_captions))
+            future = futures.popleft()
             try:
-                base64_img = encode_image(final_path)
-                caption_text = "makima 🩸" 
-                attempts = 0
-                
-                while attempts < 3:
-                    try:
-                        chat_response = client.chat.complete(
-                            model="pixtral-12b-2409",
-                            messages=[{"role": "user", "content": [{"type": "text", "text": SYSTEM_PROMPT}, {"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_img}"}]}]
-                        )
-                        raw = chat_response.choices[0].message.content.strip().lower().replace(".", "").replace('"', '')
-                        
-                        if raw in recent_captions:
-                            print(f"   ⚠️ Duplicate caption '{raw}'. shuffling...")
-                            attempts += 1
-                            continue 
-                        else:
-                            caption_text = raw
-                            break
-                    except Exception as api_error:
-                        print(f"   ⚠️ API Error ({api_error}). Retrying in 5s...")
-                        time.sleep(5)
-                        attempts += 1
-                
-                recent_captions.append(caption_text)
-                if len(recent_captions) > 5: recent_captions.pop(0)
-
-                smart_hashtags = generate_smart_hashtags()
-                
-                # --- FLATTENED CAPTION ---
-                # Replaced "\n\n" with a simple space to ensure 1 line per post
-                final_caption = f"day {day_number}. {caption_text}. {smart_hashtags}"
-                
-                print(f"   📝 Caption: {final_caption}")
-                
-                # Removed newlines from the link reply as well
-                thread_reply_text = f"create your own unrestricted makima here: {LINK_URL}"
-                
-                jitter_minutes = random.randint(JITTER_MINUTES_MIN, JITTER_MINUTES_MAX)
-                actual_post_time = current_baseline + datetime.timedelta(minutes=jitter_minutes)
-                post_at_str = actual_post_time.strftime("%Y-%m-%d %H:%M")
-                
-                row = [ACCOUNT_HANDLE, final_caption, final_filename, post_at_str, "", "TRUE", "", "", "", "", thread_reply_text]
-                writer.writerow(row)
-                
-                save_last_schedule(current_baseline)
-                current_baseline += datetime.timedelta(hours=HOURS_BETWEEN_POSTS)
-                time.sleep(1.5)
-
+                results = future.result()
             except Exception as e:
-                print(f"   ❌ Error processing {filename}: {e}")
+                results = [e] * len(group)
+            for (filename, day_number), result in zip(group, results):
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    final_path, image_hash, raw = result
+                    final_filename = os.path.basename(final_path)
+                    print(f"Processing Day {day_number}: {final_filename}...")
+                    
+                    caption_text = pick_caption(client, bucket, final_path, image_hash, raw, recent_captions)
+                    if caption_text != raw and caption_text != FALLBACK_CAPTION:
+                        cache.put(image_hash, caption_text)  # Remember the re-asked one that was used
+                    
+                    recent_captions.append(caption_text)
+                    if len(recent_captions) > 5: recent_captions.pop(0)
+
+                    smart_hashtags = generate_smart_hashtags()
+                    
+                    # --- FLATTENED CAPTION ---
+                    # Replaced "\n\n" with a simple space to ensure 1 line per post
+                    final_caption = f"day {day_number}. {caption_text}. {smart_hashtags}"
+                    
+                    print(f"   📝 Caption: {final_caption}")
+                    
+                    # Removed newlines from the link reply as well
+                    thread_reply_text = f"create your own unrestricted makima here: {LINK_URL}"
+                    
+                    jitter_minutes = random.randint(JITTER_MINUTES_MIN, JITTER_MINUTES_MAX)
+                    actual_post_time = current_baseline + datetime.timedelta(minutes=jitter_minutes)
+                    post_at_str = actual_post_time.strftime("%Y-%m-%d %H:%M")
+                    
+                    row = [ACCOUNT_HANDLE, final_caption, final_filename, post_at_str, "", "TRUE", "", "", "", "", thread_reply_text]
+                    
+                    save_last_schedule(current_baseline)
+                    current_baseline += datetime.timedelta(hours=HOURS_BETWEEN_POSTS)
+                    journal.commit(row, current_baseline, caption=caption_text)
+
+                except Exception as e:
+                    print(f"   ❌ Error processing {filename}: {e}")
+                    journal.commit(None, None)
+
+    journal.finalize(headers)
+
+    cache.evict()
+    prune_vision_cache()
+    print(cache.summary())
+    if CAPTION_STATS["batch_requests"] or CAPTION_STATS["single"] or CAPTION_STATS["failed_batches"]:
+        print(caption_stats_summary())
+    if VISION_STATS["images"]:
+        print(vision_stats_summary())
+    cache.close()
 
     print(f"\n✅ SUCCESS! Check '{OUTPUT_CSV}'.")
     print(f"📅 Next run will resume from: {current_baseline}")
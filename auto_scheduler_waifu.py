@@ -1,9 +1,11 @@
 import os
-import csv
 import datetime
 import random
-import hashlib
 from PIL import Image
+from image_utils import open_for_width, format_load_stats, prepare_ahead
+from hash_index import HashIndex
+from near_duplicates import NearDuplicateIndex, dhash_many
+from run_journal import RunJournal
 from dotenv import load_dotenv
 
 # --- CONFIGURATION ---
@@ -14,6 +16,10 @@ IMAGES_FOLDER = "images/waifu"           # <--- UPDATED: Dedicated folder for sa
 OUTPUT_CSV = "waifu_data/outputs/postpone_upload_waifu.csv" # Different output name
 SEQUENCE_FILE = "waifu_data/.sequence_id"     # Unique tracker
 DATE_TRACKER_FILE = "waifu_data/.last_date"   # Unique tracker
+HASH_INDEX_FILE = "waifu_data/.hash_index.sqlite"   # Content hashes of files already seen (path, size, mtime)
+HASH_ALGORITHM = "blake2b"   # "md5" = the digests older runs stored
+NEAR_DUPLICATE_INDEX_FILE = "waifu_data/.near_duplicates.sqlite"   # dHashes of every image ever posted
+NEAR_DUPLICATE_DISTANCE = 6  # Max differing dHash bits (of 64) to treat a new file as already posted
 PLATFORM_PREFIX = "twitter_waifu"        # Unique prefix so it doesn't touch Makima files
 
 # Account Handle
@@ -32,6 +38,8 @@ JITTER_MINUTES_MAX = 25
 
 # Optimization Settings
 TARGET_WIDTH = 1080
+PREP_WORKERS = 4      # Processes hash-washing upcoming images (1 = inline)
+PREP_LOOKAHEAD = 8    # Images washed ahead of the row being written
 
 # --- GLOBAL EMOJI BANK (Hearts Only) ---
 # Picked randomly for every post
@@ -160,8 +168,16 @@ def detect_character(filename):
 
 # --- UTILS ---
 
-def get_image_hash(image_path):
-    with open(image_path, "rb") as f: return hashlib.md5(f.read()).hexdigest()
+def wash_marker(jpg_path):
+    """JPEG comment naming the file it was washed into, so a resumed run can tell it's done."""
+    return f"washed:{os.path.splitext(os.path.basename(jpg_path))[0]}".encode("utf-8")
+
+def is_washed(jpg_path):
+    try:
+        with Image.open(jpg_path) as img:
+            return img.info.get("comment") == wash_marker(jpg_path)
+    except (OSError, ValueError):
+        return False
 
 def force_hash_wash_image(image_path):
     """
@@ -171,18 +187,25 @@ def force_hash_wash_image(image_path):
     """
     print(f"   🎨 Hash-Washing (Converting to JPG): {os.path.basename(image_path)}...")
     try:
-        with Image.open(image_path) as img:
+        # Decodes at reduced scale when the source is far wider than TARGET_WIDTH
+        img, load_stats = open_for_width(image_path, TARGET_WIDTH)
+        if load_stats["method"] != "full":
+            print(f"      📉 {format_load_stats(load_stats)}")
+        with img:
             if img.mode in ("RGBA", "P"): img = img.convert("RGB")
             
             # Resize only if width is too large
-            if img.width > TARGET_WIDTH:
-                aspect_ratio = img.height / img.width
+            orig_w, orig_h = load_stats["original"]
+            if orig_w > TARGET_WIDTH:
+                aspect_ratio = orig_h / orig_w
                 new_height = int(TARGET_WIDTH * aspect_ratio)
                 img = img.resize((TARGET_WIDTH, new_height), Image.Resampling.LANCZOS)
             
-            # Save as optimized JPEG (Changing format = New Hash)
+            # Save as optimized JPEG (Changing format = New Hash). Written next to it and swapped
+            # in, so a crash never leaves a half-written file in place of a .jpg source
             new_path = os.path.splitext(image_path)[0] + ".jpg"
-            img.save(new_path, "JPEG", quality=90, optimize=True)
+            img.save(new_path + ".tmp", "JPEG", quality=90, optimize=True, comment=wash_marker(new_path))
+            os.replace(new_path + ".tmp", new_path)
             
         # Delete original if it was different
         if new_path != image_path: 
@@ -197,10 +220,16 @@ def rename_and_prepare_files():
     start_index = get_next_sequence_number()
     all_files = [f for f in os.listdir(IMAGES_FOLDER) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
     
+    # Only new or changed files are actually hashed; the rest come from the index
+    hash_index = HashIndex(HASH_INDEX_FILE, HASH_ALGORITHM)
+    hash_index.prune(IMAGES_FOLDER, all_files)
+    # One parallel pass over everything not indexed yet (new drops are usually most of it)
+    file_hashes = hash_index.get_many([os.path.join(IMAGES_FOLDER, f) for f in all_files])
+    
     existing_hashes = set()
     for f in all_files:
         if f.startswith(f"{PLATFORM_PREFIX}_img_"):
-            existing_hashes.add(get_image_hash(os.path.join(IMAGES_FOLDER, f)))
+            existing_hashes.add(file_hashes[os.path.join(IMAGES_FOLDER, f)])
             
     new_files = []
     for f in all_files:
@@ -208,6 +237,15 @@ def rename_and_prepare_files():
         if not f.startswith(f"{PLATFORM_PREFIX}_img_"):
             new_files.append(f)
 
+    # Perceptual check against the whole posted history, so re-exports and resizes are caught
+    # too. Posted files the index hasn't seen yet (e.g. from before it existed) are added first.
+    near_index = NearDuplicateIndex(NEAR_DUPLICATE_INDEX_FILE)
+    unindexed = [f for f in all_files if f.startswith(f"{PLATFORM_PREFIX}_img_")
+                 and os.path.splitext(f)[0] not in near_index.known]
+    dhashes = dhash_many([os.path.join(IMAGES_FOLDER, f) for f in unindexed + new_files])
+    for f in unindexed:
+        near_index.add(os.path.splitext(f)[0], dhashes[os.path.join(IMAGES_FOLDER, f)])
+
     random.shuffle(new_files)
     
     renamed_files_list = []
@@ -217,11 +255,16 @@ def rename_and_prepare_files():
     for filename in new_files:
         full_path = os.path.join(IMAGES_FOLDER, filename)
         
-        img_hash = get_image_hash(full_path)
+        img_hash = file_hashes[full_path]
         if img_hash in existing_hashes:
             print(f"   🚫 Skipping Duplicate: {filename}")
             continue 
         
+        match = near_index.find(dhashes[full_path], NEAR_DUPLICATE_DISTANCE)
+        if match is not None:
+            print(f"   🚫 Skipping Near-Duplicate: {filename} (looks like {match[0]}, {match[1]} bits apart)")
+            continue
+        
         char_info = detect_character(filename)
         
         # New filename logic: twitter_waifu_img_001.jpg
@@ -231,14 +274,36 @@ def rename_and_prepare_files():
         new_path = os.path.join(IMAGES_FOLDER, new_name)
         
         os.rename(full_path, new_path)
+        hash_index.rename(full_path, new_path)
+        near_index.add(os.path.splitext(new_name)[0], dhashes[full_path])
         renamed_files_list.append((new_name, current_index, char_info))
         
         existing_hashes.add(img_hash)
         current_index += 1
     
     if current_index > start_index: update_sequence_number(current_index - 1)
+    print(hash_index.summary())
+    print(near_index.summary())
+    hash_index.close()
+    near_index.close()
     return renamed_files_list
 
+def wash_planned_image(filename):
+    """
+    Hash-washes a renamed image, unless an interrupted run already did. The journal only
+    sees washes whose row got committed, while the pool washes PREP_LOOKAHEAD images ahead,
+    so the washed JPEG itself carries the marker (a .jpg source keeps its name).
+    """
+    full_path = os.path.join(IMAGES_FOLDER, filename)
+    washed_path = os.path.splitext(full_path)[0] + ".jpg"
+    if is_washed(washed_path):
+        if washed_path != full_path and os.path.exists(full_path):
+            os.remove(full_path)  # Crashed between writing the JPEG and deleting the original
+        return washed_path
+    if not os.path.exists(full_path) and os.path.exists(washed_path):
+        return washed_path  # Washed by a run from before the marker existed
+    return force_hash_wash_image(full_path)
+
 def get_next_schedule_slot(current_dt):
     next_hour = None
     for h in TARGET_HOURS:
@@ -258,48 +323,59 @@ def main():
         print(f"Error: Folder '{IMAGES_FOLDER}' not found. Please create it!")
         return
 
-    files_data = rename_and_prepare_files()
-    
-    if not files_data:
-        print("No new files to process!")
-        return
+    # A run that crashed halfway is finished first: its files are already renamed and its
+    # committed rows are kept, so only the rest gets hash-washed
+    journal = RunJournal(OUTPUT_CSV)
+    if journal.load():
+        print(f"♻️ Resuming interrupted run: {len(journal.entries)}/{len(journal.plan)} rows already done")
+    else:
+        files_data = rename_and_prepare_files()
+        
+        if not files_data:
+            print("No new files to process!")
+            return
+        journal.begin(files_data, get_start_schedule())
 
-    current_baseline = get_start_schedule()
+    current_baseline = journal.next_slot()
     
     headers = ["account", "text", "gallery", "post_at", "community", "share_with_followers", "auto_retweet", "retweet_by", "remove_after", "remove_min_likes", "thread_reply"]
     
     print("\n--- Starting Content Factory (DailyWaifuAI) ---")
     
-    with open(OUTPUT_CSV, mode='w', newline='', encoding='utf-8-sig') as file:
-        writer = csv.writer(file, quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(headers)
+    # --- FORCE HASH WASH (PNG -> JPG) ---
+    # Runs in a process pool PREP_LOOKAHEAD images ahead; rows are still written in plan order
+    pending = journal.pending()
+    washed = prepare_ahead(wash_planned_image, [filename for filename, _, _ in pending], PREP_WORKERS, PREP_LOOKAHEAD)
+
+    # Rows go to the journal as they are done; the CSV is written once everything is in
+    for (filename, day_number, char_info), final_path in zip(pending, washed):
+        if isinstance(final_path, Exception):
+            print(f"   ❌ Error processing {filename}: {final_path}")
+            journal.commit(None, None)
+            continue
+        final_filename = os.path.basename(final_path)
         
-        for filename, day_number, char_info in files_data:
-            full_path = os.path.join(IMAGES_FOLDER, filename)
-            
-            # --- FORCE HASH WASH (PNG -> JPG) ---
-            final_path = force_hash_wash_image(full_path)
-            final_filename = os.path.basename(final_path)
-            
-            # --- CAPTION GENERATION ---
-            emoji = random.choice(EMOJI_BANK)
-            final_caption = f"day {day_number}. {char_info['name']} {emoji}. {char_info['tags']}"
-            
-            print(f"   📝 {final_caption}")
-            
-            thread_reply_text = f"create your own unrestricted waifu here: {LINK_URL}"
-            
-            jitter_minutes = random.randint(JITTER_MINUTES_MIN, JITTER_MINUTES_MAX)
-            actual_post_time = current_baseline + datetime.timedelta(minutes=jitter_minutes)
-            post_at_str = actual_post_time.strftime("%Y-%m-%d %H:%M")
-            
-            print(f"      🕒 {post_at_str}")
+        # --- CAPTION GENERATION ---
+        emoji = random.choice(EMOJI_BANK)
+        final_caption = f"day {day_number}. {char_info['name']} {emoji}. {char_info['tags']}"
+        
+        print(f"   📝 {final_caption}")
+        
+        thread_reply_text = f"create your own unrestricted waifu here: {LINK_URL}"
+        
+        jitter_minutes = random.randint(JITTER_MINUTES_MIN, JITTER_MINUTES_MAX)
+        actual_post_time = current_baseline + datetime.timedelta(minutes=jitter_minutes)
+        post_at_str = actual_post_time.strftime("%Y-%m-%d %H:%M")
+        
+        print(f"      🕒 {post_at_str}")
 
-            row = [ACCOUNT_HANDLE, final_caption, final_filename, post_at_str, "", "TRUE", "", "", "", "", thread_reply_text]
-            writer.writerow(row)
-            
-            save_last_schedule(current_baseline)
-            current_baseline = get_next_schedule_slot(current_baseline)
+        row = [ACCOUNT_HANDLE, final_caption, final_filename, post_at_str, "", "TRUE", "", "", "", "", thread_reply_text]
+        
+        save_last_schedule(current_baseline)
+        current_baseline = get_next_schedule_slot(current_baseline)
+        journal.commit(row, current_baseline)
+
+    journal.finalize(headers)
 
     print(f"\n✅ SUCCESS! Check '{OUTPUT_CSV}'.")
     print(f"📅 Next run will resume from: {current_baseline}")
@@ -0,0 +1,134 @@
+import os
+import io
+import sys
+import csv
+import time
+import tempfile
+import argparse
+import contextlib
+from PIL import Image
+
+# Allow running as `python benchmarks/bench_auto_scheduler.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import auto_scheduler
+from fake_mistral_server import add_fake_args, fake_from_args, start_in_background
+
+# --- END-TO-END SCHEDULER BENCHMARK (OFFLINE) ---
+# Runs auto_scheduler.main() (ingest -> optimize -> caption -> CSV) on synthetic images in a
+# scratch folder, against fake_mistral_server.py instead of the real API. Comma lists sweep:
+#
+#   python benchmarks/bench_auto_scheduler.py --workers 1,4,8 --batch-size 1,4 --rate-limit 2
+#
+# Caption latency is per caption request as the scheduler sees it (rate-limit wait + retries).
+SYNTHETIC_COUNT = 40
+IMAGE_SIZE = (1200, 1600)   # Regular JPEGs (under MAX_FILE_SIZE_MB, used as-is)
+LARGE_EVERY = 5             # Every Nth image is a big noisy PNG that goes through optimize_image
+
+
+def make_images(folder, count, large_every):
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        noise = Image.effect_noise(IMAGE_SIZE, 30 + i % 50).convert("RGB")
+        if large_every and i % large_every == 0:
+            noise.resize((IMAGE_SIZE[0] * 2, IMAGE_SIZE[1] * 2)).save(os.path.join(folder, f"drop_{i}.png"))
+        else:
+            noise.save(os.path.join(folder, f"drop_{i}.jpg"), quality=95)
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def run_once(options, workers, batch_size, base_url, fake):
+    """One full scheduler run in a fresh scratch folder. Returns the measurements."""
+    latencies = []
+    complete = auto_scheduler.complete_with_retry
+
+    def timed_complete(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return complete(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    for key in auto_scheduler.CAPTION_STATS:
+        auto_scheduler.CAPTION_STATS[key] = 0
+    for key in fake.stats:
+        fake.stats[key] = 0
+
+    settings = {
+        "API_KEY": "fake-key", "MISTRAL_SERVER_URL": base_url, "CAPTION_WORKERS": workers,
+        "CAPTION_RATE_PER_SEC": options.rate, "CAPTION_BURST": options.burst,
+        "CAPTION_MAX_RETRIES": options.retries, "complete_with_retry": timed_complete,
+    }
+    saved = {name: getattr(auto_scheduler, name) for name in settings}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            os.chdir(tmp)
+            make_images(auto_scheduler.IMAGES_FOLDER, options.images, options.large_every)
+            os.makedirs(os.path.dirname(auto_scheduler.OUTPUT_CSV), exist_ok=True)
+            for name, value in settings.items():
+                setattr(auto_scheduler, name, value)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                auto_scheduler.main(["--batch-size", str(batch_size)])
+            elapsed = time.perf_counter() - start
+
+            with open(auto_scheduler.OUTPUT_CSV, "r", encoding="utf-8-sig") as f:
+                rows = list(csv.reader(f))[1:]
+        finally:
+            for name, value in saved.items():
+                setattr(auto_scheduler, name, value)
+            os.chdir(cwd)
+
+    fallbacks = sum(f"{auto_scheduler.FALLBACK_CAPTION}." in row[1] for row in rows)
+    return elapsed, len(rows), fallbacks, latencies, dict(fake.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of auto_scheduler.py.")
+    parser.add_argument("--images", type=int, default=SYNTHETIC_COUNT, help=f"default: {SYNTHETIC_COUNT}")
+    parser.add_argument("--large-every", type=int, default=LARGE_EVERY,
+                        help=f"Every Nth image needs optimizing (default: {LARGE_EVERY}, 0 = none)")
+    parser.add_argument("--workers", default=str(auto_scheduler.CAPTION_WORKERS), help="CAPTION_WORKERS values, e.g. 1,4,8")
+    parser.add_argument("--batch-size", default=str(auto_scheduler.CAPTION_BATCH_SIZE), help="--batch-size values, e.g. 1,4")
+    parser.add_argument("--rate", type=float, default=auto_scheduler.CAPTION_RATE_PER_SEC,
+                        help="Client-side requests per second (CAPTION_RATE_PER_SEC)")
+    parser.add_argument("--burst", type=int, default=auto_scheduler.CAPTION_BURST, help="CAPTION_BURST")
+    parser.add_argument("--retries", type=int, default=auto_scheduler.CAPTION_MAX_RETRIES, help="CAPTION_MAX_RETRIES")
+    add_fake_args(parser)
+    options = parser.parse_args()
+
+    fake = fake_from_args(options)
+    server, base_url = start_in_background(fake)
+    print("--- 📏 Auto Scheduler Benchmark (fake Mistral API) ---")
+    print(f"🖼️ {options.images} images | server latency {options.latency_ms:g}±{options.jitter_ms:g} ms | "
+          f"errors {options.error_rate:.0%} | server limit {options.rate_limit or 'none'} req/s | "
+          f"client rate {options.rate:g}/s burst {options.burst} | retries {options.retries}")
+
+    try:
+        for workers in [int(w) for w in options.workers.split(",")]:
+            for batch_size in [int(b) for b in options.batch_size.split(",")]:
+                elapsed, rows, fallbacks, latencies, stats = run_once(options, workers, batch_size, base_url, fake)
+                print(f"\n⚙️ workers {workers} | batch {batch_size}")
+                print(f"   {rows / elapsed * 60:8.1f} images/min | {rows} rows in {elapsed:.1f}s | "
+                      f"{fallbacks} fallback captions")
+                print(f"   caption latency p50 {percentile(latencies, 0.5):.2f}s | "
+                      f"p95 {percentile(latencies, 0.95):.2f}s | p99 {percentile(latencies, 0.99):.2f}s | "
+                      f"max {max(latencies, default=0):.2f}s")
+                print(f"   server: {stats['requests']} requests | {stats['rate_limited']} x 429 | "
+                      f"{stats['errors']} x 503 | {stats['images']} images seen")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
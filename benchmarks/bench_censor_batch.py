@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import tempfile
+from PIL import Image
+
+# Allow running as `python benchmarks/bench_censor_batch.py [folder]` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nudenet import NudeDetector
+from censor_tool import read_image, IMAGE_EXTENSIONS
+
+# --- BENCHMARK SETTINGS ---
+BATCH_SIZES = [1, 4, 8, 16, 32]
+SYNTHETIC_COUNT = 64     # Used when no folder is given
+REPEATS = 2              # Best of N per batch size
+
+
+def load_sample(folder):
+    if folder:
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+        return [read_image(p)[0] for p in paths]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pixels = []
+        for i in range(SYNTHETIC_COUNT):
+            path = os.path.join(tmp, f"synthetic_{i}.jpg")
+            size = (1200 + (i % 5) * 160, 1600 - (i % 3) * 200)
+            Image.effect_noise(size, 40 + i).convert("RGB").save(path, quality=90)
+            pixels.append(read_image(path)[0])
+        return pixels
+
+
+def round_detections(detections):
+    # Scores can wobble in the last float bits between batch shapes; compare at 1e-4
+    return [(d["class"], round(d["score"], 4), tuple(d["box"])) for d in detections]
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else None
+    print("--- 📏 NudeNet Batch Inference Benchmark (inference only, decode excluded) ---")
+    sample = load_sample(folder)
+    print(f"🖼️ {len(sample)} images | CPU cores: {os.cpu_count()}")
+
+    detector = NudeDetector()
+    baseline = [round_detections(detector.detect(p)) for p in sample]
+
+    for batch_size in BATCH_SIZES:
+        best = None
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            if batch_size == 1:
+                results = [detector.detect(p) for p in sample]
+            else:
+                results = detector.detect_batch(sample, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        matches = sum(round_detections(r) == b for r, b in zip(results, baseline))
+        print(f"   batch {batch_size:>2}: {len(sample) / best:7.1f} img/s | "
+              f"matches unbatched: {matches}/{len(sample)}")
+
+
+if __name__ == "__main__":
+    main()
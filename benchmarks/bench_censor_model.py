@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# Allow running as `python benchmarks/bench_censor_model.py <folder>` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import censor_tool
+from censor_tool import read_image, load_detector, box_iou, IMAGE_EXTENSIONS
+
+# --- ACCURACY VS SPEED REPORT ---
+# Runs the standard and the int8 model (quantize_model.py) at a few thread counts over a
+# local sample. If the folder has a labels.json, detections are scored against it:
+#     {"image.jpg": [{"class": "FEMALE_GENITALIA_EXPOSED", "box": [x, y, w, h]}, ...], ...}
+# (images with nothing to censor map to []). Without labels, the standard model's own
+# output is the reference, so the int8 rows show how closely they agree with it.
+THREAD_SETTINGS = [0, 1, 2, 4]   # --intra-threads values to try (0 = ONNX Runtime default)
+MATCH_IOU = 0.5                  # A detection counts as found at this IoU or more
+REPEATS = 2                      # Best of N timing passes
+
+
+def censored_boxes(detections):
+    """Only what censor_tool would actually pixelate."""
+    return [d for d in detections
+            if d["class"] in censor_tool.TARGET_CLASSES and d.get("score", 1.0) > censor_tool.CONFIDENCE_THRESHOLD]
+
+
+def score(predicted, expected):
+    """Box-level (tp, fp, fn) plus image-level: did an image needing censoring get any box?"""
+    tp = fp = fn = 0
+    images_needed = images_hit = 0
+    for pred, truth in zip(predicted, expected):
+        pred, truth = censored_boxes(pred), censored_boxes(truth)
+        unmatched = list(truth)
+        for d in pred:
+            match = next((t for t in unmatched if t["class"] == d["class"]
+                          and box_iou(t["box"], d["box"]) >= MATCH_IOU), None)
+            if match is None:
+                fp += 1
+            else:
+                tp += 1
+                unmatched.remove(match)
+        fn += len(unmatched)
+        if truth:
+            images_needed += 1
+            images_hit += bool(pred)
+    return tp, fp, fn, images_needed, images_hit
+
+
+def time_detector(detector, sample):
+    best = None
+    results = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        results = [detector.detect(pixels) for pixels in sample]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(sample) / best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs speed of the censor model variants.")
+    parser.add_argument("folder", help="Sample images (optionally with labels.json)")
+    parser.add_argument("--int8-model", default=censor_tool.QUANTIZED_MODEL_FILE,
+                        help="int8 model to compare (default: censor_data/320n.int8.onnx)")
+    options = parser.parse_args()
+    censor_tool.QUANTIZED_MODEL_FILE = options.int8_model
+
+    names = sorted(f for f in os.listdir(options.folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    sample = []
+    for name in names:
+        try:
+            sample.append((name, read_image(os.path.join(options.folder, name))[0]))
+        except Exception:
+            print(f"⚠️ Skipping unreadable {name}")
+    pixels = [p for _, p in sample]
+
+    labels_path = os.path.join(options.folder, "labels.json")
+    expected = None
+    if os.path.exists(labels_path):
+        with open(labels_path, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+        expected = [labels.get(name, []) for name, _ in sample]
+
+    print("--- 📏 Censor Model Report (accuracy vs speed, inference only) ---")
+    print(f"🖼️ {len(sample)} images | CPU cores: {os.cpu_count()} | "
+          f"reference: {'labels.json' if expected is not None else 'standard model output'}")
+
+    variants = [False]
+    if os.path.exists(options.int8_model):
+        variants.append(True)
+    else:
+        print(f"⚠️ No int8 model at {options.int8_model} (run quantize_model.py), standard model only")
+
+    for int8 in variants:
+        print(f"\n🧮 {'int8' if int8 else 'standard'} model")
+        for threads in THREAD_SETTINGS:
+            args = censor_tool.parse_args((["--int8"] if int8 else []) + ["--intra-threads", str(threads)])
+            detector = load_detector(args)
+            rate, results = time_detector(detector, pixels)
+            if expected is None:
+                expected = results  # First run = standard model at default threads
+
+            tp, fp, fn, needed, hit = score(results, expected)
+            precision = tp / (tp + fp) if tp + fp else 1.0
+            recall = tp / (tp + fn) if tp + fn else 1.0
+            image_recall = hit / needed if needed else 1.0
+            print(f"   threads {threads or 'auto':>4}: {rate:6.1f} img/s | box precision {precision:6.1%} | "
+                  f"box recall {recall:6.1%} | images caught {hit}/{needed} ({image_recall:.0%})")
+
+
+if __name__ == "__main__":
+    main()
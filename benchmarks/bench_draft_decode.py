@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import tempfile
+from PIL import Image, ImageChops, ImageStat
+
+# Allow running as `python benchmarks/bench_draft_decode.py [folder]` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_utils import open_for_width, format_load_stats
+
+# --- BENCHMARK SETTINGS ---
+TARGET_WIDTH = 1080
+SYNTHETIC_SIZE = (7680, 4320)   # 8K, used when no folder is given
+GRADIENT_16BIT_SIZE = (6000, 3000)
+
+
+def full_path_resize(image_path):
+    """The old path: decode everything, then LANCZOS straight to TARGET_WIDTH."""
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        new_height = int(TARGET_WIDTH * img.height / img.width)
+        return img.resize((TARGET_WIDTH, new_height), Image.Resampling.LANCZOS)
+
+
+def reduced_path_resize(image_path):
+    img, stats = open_for_width(image_path, TARGET_WIDTH)
+    orig_w, orig_h = stats["original"]
+    img = img.convert("RGB")
+    new_height = int(TARGET_WIDTH * orig_h / orig_w)
+    return img.resize((TARGET_WIDTH, new_height), Image.Resampling.LANCZOS), stats
+
+
+def bench(image_path):
+    start = time.perf_counter()
+    full = full_path_resize(image_path)
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reduced, stats = reduced_path_resize(image_path)
+    reduced_seconds = time.perf_counter() - start
+
+    # Mean absolute difference per channel (0-255) between the two outputs
+    diff = sum(ImageStat.Stat(ImageChops.difference(full, reduced)).mean) / 3
+
+    print(f"\n🖼️ {os.path.basename(image_path)}")
+    print(f"   {format_load_stats(stats)}")
+    print(f"   full decode + resize: {full_seconds:.2f}s | reduced: {reduced_seconds:.2f}s "
+          f"(saved {full_seconds - reduced_seconds:.2f}s) | mean pixel diff {diff:.2f}")
+
+
+def check_16bit_gradient(folder):
+    """A 16-bit gradient must come out of the reduced path as a gradient, not clamped to white."""
+    width, height = GRADIENT_16BIT_SIZE
+    ramp = Image.linear_gradient("L").resize((height, width)).rotate(90, expand=True)  # Dark -> light, left to right
+    source = ramp.convert("I").point(lambda v: v * 257).convert("I;16")
+    path = os.path.join(folder, "gradient_16bit.png")
+    source.save(path)
+
+    img, stats = open_for_width(path, TARGET_WIDTH)
+    low, high = img.convert("L").getextrema()
+    mean = ImageStat.Stat(img.convert("L")).mean[0]
+    print(f"\n🧪 16-bit gradient: {format_load_stats(stats)} | mode {img.mode} | "
+          f"range {low}-{high} | mean {mean:.1f}")
+    assert stats["method"] != "full", "16-bit PNG was not reduced"
+    assert low < 16 and high > 240 and 110 < mean < 145, "16-bit samples were clamped instead of scaled"
+
+
+def main():
+    print("--- 📏 Reduced-Decode Benchmark ---")
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
+                bench(os.path.join(folder, name))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Image.radial_gradient("L").resize(SYNTHETIC_SIZE).convert("RGB")
+        source = Image.blend(source, Image.effect_noise(SYNTHETIC_SIZE, 40).convert("RGB"), 0.3)
+        for ext in ("jpg", "png"):
+            path = os.path.join(tmp, f"synthetic_8k.{ext}")
+            source.save(path)
+            bench(path)
+        check_16bit_gradient(tmp)
+
+
+if __name__ == "__main__":
+    main()
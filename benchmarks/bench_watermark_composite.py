@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from PIL import Image
+
+# Allow running as `python benchmarks/bench_watermark_composite.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_utils import get_logo_variant, composite_logo
+import watermark_logo
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- BENCHMARK SETTINGS ---
+IMAGE_SIZES = [(3840, 2160), (6000, 4000)]   # 4K and a 24MP source
+ITERATIONS = 10
+
+
+def legacy_watermark(image_path, logo, x_pos, y_pos):
+    """The pre-ROI path: full-frame RGBA base + full-frame transparent layer."""
+    base_image = Image.open(image_path).convert("RGBA")
+    transparent_layer = Image.new("RGBA", base_image.size, (0, 0, 0, 0))
+    transparent_layer.paste(logo, (x_pos, y_pos), mask=logo)
+    final = Image.alpha_composite(base_image, transparent_layer)
+    return final.convert("RGB")
+
+
+def roi_watermark(image_path, logo, x_pos, y_pos):
+    return composite_logo(Image.open(image_path), logo, x_pos, y_pos)
+
+
+def run_variant(name, image_path, out_path, queue):
+    logo_source = Image.open(watermark_logo.WATERMARK_FILE).convert("RGBA")
+    func = legacy_watermark if name == "legacy" else roi_watermark
+
+    with Image.open(image_path) as probe:
+        base_w, base_h = probe.size
+    logo = get_logo_variant(logo_source, int(base_w * watermark_logo.LOGO_SCALE), watermark_logo.OPACITY)
+    x_pos = base_w - logo.width - watermark_logo.PADDING_X
+    y_pos = base_h - logo.height - watermark_logo.PADDING_Y
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        final = func(image_path, logo, x_pos, y_pos)
+        final.save(out_path, "JPEG", quality=95)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    if sys.platform == "darwin":
+        peak //= 1024
+    queue.put((ITERATIONS / elapsed, peak / 1024))
+
+
+def measure(name, image_path, out_path):
+    # Fresh process per variant so peak RSS isn't shared between them
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=run_variant, args=(name, image_path, out_path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    print("--- 📏 Watermark Compositing Benchmark (legacy vs ROI) ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in IMAGE_SIZES:
+            image_path = os.path.join(tmp, f"src_{size[0]}x{size[1]}.jpg")
+            Image.effect_noise(size, 64).convert("RGB").save(image_path, "JPEG", quality=95)
+
+            results = {}
+            for name in ("legacy", "roi"):
+                out_path = os.path.join(tmp, f"{name}.jpg")
+                results[name] = measure(name, image_path, out_path)
+
+            with open(os.path.join(tmp, "legacy.jpg"), "rb") as a, open(os.path.join(tmp, "roi.jpg"), "rb") as b:
+                identical = a.read() == b.read()
+
+            print(f"\n🖼️ {size[0]}x{size[1]} ({ITERATIONS} iterations)")
+            for name, (rate, peak_mb) in results.items():
+                print(f"   {name:<7} {rate:6.2f} img/s | peak RSS {peak_mb:7.1f} MB")
+            speedup = results["roi"][0] / results["legacy"][0]
+            print(f"   ⚡ Speedup: {speedup:.2f}x | Output identical: {'✅' if identical else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- FAKE MISTRAL CHAT API ---
+# Answers POST /v1/chat/completions the way the mistralai client expects, with canned
+# captions, so auto_scheduler.py can be load-tested offline and for free:
+#
+#   python benchmarks/fake_mistral_server.py --latency-ms 800 --error-rate 0.05
+#   MISTRAL_SERVER_URL=http://127.0.0.1:8089 python auto_scheduler.py
+#
+# Batched requests (several images) get the {"captions": [...]} JSON reply they ask for.
+DEFAULT_PORT = 8089
+CANNED_CAPTIONS = ["office siren 🚨", "control 🐕", "listening 🎧", "morning ☕",
+                   "night shift 🌙", "gaze 👁️", "red 🩸", "quiet rain 🌧️", "leash 🔗", "smile 🙂"]
+
+
+class FakeMistral:
+    """Settings + counters shared by the request handler threads."""
+
+    def __init__(self, latency_ms=500, jitter_ms=200, error_rate=0.0, rate_limit=0.0,
+                 retry_after=1.0, captions=CANNED_CAPTIONS, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit     # Requests per second before 429s (0 = unlimited)
+        self.retry_after = retry_after   # Retry-After header sent with a 429 (0 = none)
+        self.captions = list(captions)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "images": 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def over_rate(self):
+        """Fixed one-second window: anything past rate_limit requests in it gets a 429."""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            self.window_count += 1
+            return self.window_count > self.rate_limit
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def failed(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def caption(self):
+        with self.lock:
+            return self.random.choice(self.captions)
+
+
+def image_count(body):
+    count = 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            count += sum(1 for part in content if isinstance(part, dict) and part.get("type") == "image_url")
+    return count
+
+
+class Handler(BaseHTTPRequestHandler):
+    fake = None  # Set by make_server
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        fake = self.fake
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(400, {"message": "invalid JSON body"})
+            return
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_json(404, {"message": f"unknown endpoint {self.path}"})
+            return
+
+        fake.count("requests")
+        if fake.over_rate():
+            fake.count("rate_limited")
+            headers = {"Retry-After": f"{fake.retry_after:g}"} if fake.retry_after else None
+            self.send_json(429, {"message": "Requests rate limit exceeded"}, headers)
+            return
+
+        time.sleep(fake.delay())
+        if fake.failed():
+            fake.count("errors")
+            self.send_json(503, {"message": "Service unavailable"})
+            return
+
+        images = image_count(body)
+        fake.count("images", images)
+        if images > 1:
+            content = json.dumps({"captions": [{"image": i + 1, "caption": fake.caption()} for i in range(images)]},
+                                 ensure_ascii=False)
+        else:
+            content = fake.caption()
+        prompt_tokens = 200 + 1000 * images
+        fake.count("ok")
+        self.send_json(200, {
+            "id": f"fake-{time.time_ns()}",
+            "object": "chat.completion",
+            "model": body.get("model", "fake"),
+            "created": int(time.time()),
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 8 * max(1, images),
+                      "total_tokens": prompt_tokens + 8 * max(1, images)},
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+        })
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+def make_server(fake, host="127.0.0.1", port=DEFAULT_PORT):
+    """ThreadingHTTPServer for fake (port 0 = any free port). Call serve_forever() on it."""
+    handler = type("FakeMistralHandler", (Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(fake, host="127.0.0.1", port=0):
+    """Starts a server thread; returns (server, base URL for Mistral(server_url=...))."""
+    server = make_server(fake, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_fake_args(parser):
+    parser.add_argument("--latency-ms", type=float, default=500, help="Mean response time (default: 500)")
+    parser.add_argument("--jitter-ms", type=float, default=200, help="+/- random spread on the latency (default: 200)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 503 (default: 0)")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Requests per second before 429s (default: 0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Retry-After seconds sent with 429s (default: 1, 0 = no header)")
+    parser.add_argument("--captions", help="Text file with one canned caption per line")
+    parser.add_argument("--seed", type=int, help="Random seed for repeatable runs")
+
+
+def fake_from_args(args):
+    captions = CANNED_CAPTIONS
+    if args.captions:
+        with open(args.captions, "r", encoding="utf-8") as f:
+            captions = [line.strip() for line in f if line.strip()] or CANNED_CAPTIONS
+    return FakeMistral(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit,
+                       args.retry_after, captions, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Mistral chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"default: {DEFAULT_PORT}")
+    add_fake_args(parser)
+    args = parser.parse_args()
+
+    fake = fake_from_args(args)
+    server = make_server(fake, args.host, args.port)
+    print(f"🟢 Fake Mistral API on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stopping: {fake.stats}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
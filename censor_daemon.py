@@ -0,0 +1,159 @@
+import os
+import json
+import signal
+import socket
+import argparse
+
+import censor_tool
+from censor_pipeline import PipelineStats
+
+# --- CENSOR DAEMON ---
+# Loads the NudeNet model (and the detection cache) once and keeps them warm.
+# censor_tool.py connects over a Unix socket, sends its jobs + current settings,
+# and gets one JSON line back per finished image. Clients are served one at a time.
+#
+#   python censor_daemon.py          # leave running in a terminal
+#   python censor_tool.py            # picks it up automatically (--no-daemon to skip)
+
+SETTINGS = ("PIXEL_BLOCK_SIZE", "CONFIDENCE_THRESHOLD", "BOX_PADDING", "TARGET_CLASSES",
+            "TILE_MIN_SIDE", "TILE_SIZE", "TILE_MIN_SCORE", "TILE_CONTEXT", "MAX_TILES", "TILE_MERGE_IOU")
+OPTIONS = ("batch_size", "pipeline", "io_threads", "workers", "no_cache", "tiled", "report")
+
+def apply_settings(settings):
+    """Uses the client's censor settings for this request."""
+    for name in SETTINGS:
+        if name in settings:
+            setattr(censor_tool, name, settings[name])
+
+def send(conn, message):
+    # Unbuffered on purpose: nothing left to flush (and fail) when a gone client is closed
+    conn.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+def handle_client(conn, detector, cache, model_args):
+    with conn, conn.makefile("rb") as stream:
+        line = stream.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        session = censor_tool.session_settings(model_args)
+        wanted = request.get("session", {})
+        if wanted != session:
+            # The session is fixed for the daemon's lifetime; let the client load the one it asked for
+            send(conn, {"refused": f"it runs the {censor_tool.describe_session(session)}, "
+                                   f"not the {censor_tool.describe_session(wanted)}"})
+            return
+        apply_settings(request.get("settings", {}))
+
+        args = censor_tool.parse_args([])
+        for name in OPTIONS:
+            if name in request.get("options", {}):
+                setattr(args, name, request["options"][name])
+
+        jobs = [tuple(job) for job in request["jobs"]]
+        use_cache = None if args.no_cache or cache is None else cache
+        hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        stats = PipelineStats() if args.pipeline else None
+        tile_counts = dict(censor_tool.TILE_STATS)
+        censor_tool.RUN_REPORT = censor_tool.RunReport() if args.report else None
+        print(f"📥 {len(jobs)} images requested")
+
+        client_gone = False
+        processed = 0
+        for (in_path, _), success, result in censor_tool.iter_results(detector, jobs, args, use_cache, stats):
+            processed += success
+            if client_gone:
+                continue  # Keep going so the pipeline threads drain; outputs still get written
+            message = {"in": in_path, "ok": success}
+            if success:
+                message["censored"] = result
+            else:
+                message["error"] = str(result)
+            try:
+                send(conn, message)
+            except (BrokenPipeError, ConnectionResetError):
+                client_gone = True
+                print("⚠️ Client disconnected, finishing the remaining images anyway")
+
+        summary = []
+        if use_cache is not None:
+            use_cache.flush()
+            summary.append(f"🗃️ Detection cache: {cache.hits - hits} hits, "
+                           f"{cache.misses - misses} misses (model runs)")
+        if stats is not None:
+            summary.append(stats.summary(args.io_threads, args.workers))
+        if args.tiled:
+            # Report this request only, not the daemon's lifetime totals
+            delta = {key: censor_tool.TILE_STATS[key] - value for key, value in tile_counts.items()}
+            summary.append(censor_tool.tile_stats_summary(delta))
+        if censor_tool.RUN_REPORT is not None:
+            settings = censor_tool.report_settings(args)
+            settings.update(session, no_cache=use_cache is None, daemon=True)
+            summary.append(censor_tool.RUN_REPORT.write(args.report, processed, len(jobs) - processed, settings))
+            censor_tool.RUN_REPORT = None
+        print(f"📤 {processed}/{len(jobs)} images done")
+
+        if not client_gone:
+            try:
+                send(conn, {"done": True, "summary": summary})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(socket_path, args):
+    if not hasattr(socket, "AF_UNIX"):
+        print("❌ Unix sockets are not available on this platform.")
+        return
+
+    detector = censor_tool.load_detector(args)
+    cache = censor_tool.open_cache(args, detector)
+
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    # A leftover socket file from a crashed daemon would block bind()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Clients tell the daemon where to write, so only this user may connect. The umask makes
+    # bind() create the socket as 0600 already; a chmod afterwards would leave a window open
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(4)
+    print(f"🟢 Censor daemon listening on {socket_path} (Ctrl+C to stop)")
+    print(f"⚙️ Session: {censor_tool.describe_session(censor_tool.session_settings(args))}")
+    # Treat `kill` like Ctrl+C so the socket file is cleaned up either way
+    signal.signal(signal.SIGTERM, _stop)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                handle_client(conn, detector, cache, args)
+            except Exception as e:
+                print(f"❌ Request failed: {e}")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping censor daemon")
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        if cache is not None:
+            print(cache.summary())
+            cache.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Keep the NudeNet model loaded for censor_tool.py.")
+    parser.add_argument("--socket", default=censor_tool.DAEMON_SOCKET,
+                        help="Unix socket to listen on (default: censor_data/.censor_daemon.sock)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Don't keep a detection cache in the daemon")
+    censor_tool.add_session_args(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    serve(args.socket, args)
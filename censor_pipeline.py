@@ -0,0 +1,183 @@
+import time
+import queue
+import threading
+
+# --- STAGED CENSOR PIPELINE ---
+# decode (I/O threads) -> detect (one thread, owns the model) -> finish (worker threads)
+# Bounded queues between the stages keep memory flat while the model stage stays fed.
+# OpenCV, ONNX Runtime and Pillow's resize/encode all release the GIL, so threads overlap.
+
+_DONE = object()
+
+class PipelineStats:
+    """Per-stage busy time / item counts and sampled queue depths. Thread-safe."""
+
+    STAGES = ("decode", "detect", "finish")
+
+    def __init__(self):
+        self.queues = {}
+        self.lock = threading.Lock()
+        self.seconds = {stage: 0.0 for stage in self.STAGES}
+        self.items = {stage: 0 for stage in self.STAGES}
+        self.batches = 0
+        self.depth_sum = {}
+        self.depth_max = {}
+        self.samples = 0
+        self.started = time.perf_counter()
+
+    def watch(self, **queues):
+        """Registers the queues whose depth is sampled."""
+        self.queues.update(queues)
+        for name in queues:
+            self.depth_sum.setdefault(name, 0)
+            self.depth_max.setdefault(name, 0)
+
+    def add(self, stage, seconds, items=1):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.items[stage] += items
+            if stage == "detect":
+                self.batches += 1
+
+    def sample_depths(self):
+        with self.lock:
+            self.samples += 1
+            for name, q in self.queues.items():
+                depth = q.qsize()
+                self.depth_sum[name] += depth
+                self.depth_max[name] = max(self.depth_max[name], depth)
+
+    def summary(self, io_threads, workers):
+        wall = time.perf_counter() - self.started
+        threads = {"decode": io_threads, "detect": 1, "finish": workers}
+        lines = [f"⏱️ Pipeline: {wall:.1f}s wall"]
+        for stage in self.STAGES:
+            busy = self.seconds[stage]
+            # Utilisation of the stage's threads over the run (detect near 100% = model saturated)
+            utilisation = busy / (wall * threads[stage]) * 100 if wall else 0.0
+            per_item = busy / self.items[stage] * 1000 if self.items[stage] else 0.0
+            lines.append(f"   {stage:<7} {busy:7.1f}s busy | {per_item:6.1f} ms/img | "
+                         f"{utilisation:5.1f}% of {threads[stage]} thread(s)")
+        if self.batches:
+            lines.append(f"   detect  {self.items['detect'] / self.batches:.1f} img/batch avg")
+        for name in self.queues:
+            avg = self.depth_sum[name] / self.samples if self.samples else 0.0
+            lines.append(f"   queue {name:<8} avg depth {avg:5.1f} | max {self.depth_max[name]}")
+        return "\n".join(lines)
+
+def run_pipeline(jobs, decode, detect, finish, batch_size=1, io_threads=4, workers=4, queue_size=32, stats=None):
+    """
+    Runs (in_path, out_path) jobs through the three stages and yields
+    (job, success, result_or_error) as each image finishes (not in input order).
+
+    decode(in_path) -> pixels
+    detect([pixels, ...]) -> [detections, ...]   (called from a single thread only)
+    finish(pixels, detections, out_path) -> result
+    """
+    job_q = queue.Queue()
+    decoded_q = queue.Queue(maxsize=queue_size)
+    detected_q = queue.Queue(maxsize=queue_size)
+    result_q = queue.Queue()
+    if stats is None:
+        stats = PipelineStats()
+    stats.watch(decoded=decoded_q, detected=detected_q)
+
+    for job in jobs:
+        job_q.put(job)
+    for _ in range(io_threads):
+        job_q.put(_DONE)
+
+    def decode_stage():
+        while True:
+            job = job_q.get()
+            if job is _DONE:
+                decoded_q.put(_DONE)
+                return
+            start = time.perf_counter()
+            try:
+                pixels = decode(job[0])
+            except Exception as e:
+                result_q.put((job, False, e))
+                continue
+            stats.add("decode", time.perf_counter() - start)
+            decoded_q.put((job, pixels))
+
+    def run_detect(batch):
+        start = time.perf_counter()
+        try:
+            results = detect([pixels for _, pixels in batch])
+            stats.add("detect", time.perf_counter() - start, len(batch))
+            return list(zip(batch, results))
+        except Exception:
+            if len(batch) == 1:
+                raise
+        # A bad image shouldn't sink the whole batch: retry one by one
+        paired = []
+        for item in batch:
+            try:
+                paired.extend(run_detect([item]))
+            except Exception as e:
+                result_q.put((item[0], False, e))
+        return paired
+
+    def detect_stage():
+        remaining = io_threads
+        while remaining:
+            item = decoded_q.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            batch = [item]
+            # Take whatever else is already decoded, without waiting for a full batch
+            while len(batch) < batch_size and remaining:
+                try:
+                    extra = decoded_q.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is _DONE:
+                    remaining -= 1
+                else:
+                    batch.append(extra)
+
+            try:
+                paired = run_detect(batch)
+            except Exception as e:
+                for job, _ in batch:
+                    result_q.put((job, False, e))
+                continue
+            for (job, pixels), detections in paired:
+                detected_q.put((job, pixels, detections))
+
+        for _ in range(workers):
+            detected_q.put(_DONE)
+
+    def finish_stage():
+        while True:
+            item = detected_q.get()
+            if item is _DONE:
+                result_q.put(_DONE)
+                return
+            job, pixels, detections = item
+            start = time.perf_counter()
+            try:
+                result = finish(pixels, detections, job[1])
+            except Exception as e:
+                result_q.put((job, False, e))
+                continue
+            stats.add("finish", time.perf_counter() - start)
+            result_q.put((job, True, result))
+
+    threads = [threading.Thread(target=decode_stage, daemon=True) for _ in range(io_threads)]
+    threads.append(threading.Thread(target=detect_stage, daemon=True))
+    threads.extend(threading.Thread(target=finish_stage, daemon=True) for _ in range(workers))
+    for thread in threads:
+        thread.start()
+
+    remaining = workers
+    while remaining:
+        item = result_q.get()
+        if item is _DONE:
+            remaining -= 1
+            continue
+        stats.sample_depths()
+        yield item
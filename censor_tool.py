@@ -1,7 +1,17 @@
 import os
-from nudenet import NudeDetector
+import json
+import time
+import hashlib
+import sqlite3
+import socket
+import argparse
+import threading
+import cv2
+import numpy as np
 from PIL import Image
 from tqdm import tqdm
+from file_scanner import iter_jobs
+from censor_pipeline import run_pipeline, PipelineStats
 
 # --- AGGRESSIVE NUDENET CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -17,6 +27,50 @@ CONFIDENCE_THRESHOLD = 0.08  # 8% confidence (was 0.25)
 # AGGRESSIVE: Large padding to ensure full coverage
 BOX_PADDING = 70  # 70px padding (was 45)
 
+# Images per inference call (1 = one forward pass per image). Overridden by --batch-size.
+BATCH_SIZE = 1
+
+# Pipelined mode (--pipeline): decode threads -> one model thread -> pixelate/save threads
+IO_THREADS = 4        # Decode/prefetch threads
+CENSOR_WORKERS = 4    # Pixelate + encode threads
+QUEUE_SIZE = 32       # Max decoded images waiting between stages (bounds memory)
+
+# Raw detections are cached per (image content, model), so re-runs after changing
+# CONFIDENCE_THRESHOLD / BOX_PADDING / PIXEL_BLOCK_SIZE skip the model entirely.
+DETECTION_CACHE_FILE = os.path.join(BASE_DIR, "censor_data", ".detection_cache.sqlite")
+
+# A running censor_daemon.py keeps the model loaded between runs; this tool then only
+# submits jobs to it. Without a daemon everything runs in-process as before.
+DAEMON_SOCKET = os.path.join(BASE_DIR, "censor_data", ".censor_daemon.sock")
+
+# ONNX Runtime threads per model session (0 = its default: all physical cores). When several
+# censor processes share a host, give each one cores / processes so they don't oversubscribe.
+ORT_INTRA_OP_THREADS = 0
+ORT_INTER_OP_THREADS = 0
+# Graph optimization level: "disabled", "basic", "extended" or "all"
+ORT_GRAPH_OPTIMIZATION = "all"
+# int8 copy of the model for CPU-only hosts, written by quantize_model.py, used with --int8
+QUANTIZED_MODEL_FILE = os.path.join(BASE_DIR, "censor_data", "320n.int8.onnx")
+
+# Two-pass detection (--tiled): the normal downscaled pass runs first, then full-resolution
+# crops around whatever it found are checked again and the boxes are merged. Small regions
+# on big images survive that way, and images with nothing in the first pass cost nothing extra.
+# NudeNet scales every input's longer side to the model's input_width (320), so the first pass
+# sees a 4000px image at 0.08x while a TILE_SIZE crop is seen at 320 / 640 = 0.5x (less for
+# crops grown by TILE_CONTEXT around big boxes).
+TILE_MIN_SIDE = 1280     # Only images whose longer side exceeds this get the second pass
+TILE_SIZE = 640          # Minimum crop side in source pixels
+TILE_MIN_SCORE = 0.05    # First-pass TARGET_CLASSES hits below this score get no crop
+TILE_CONTEXT = 2.5       # Crop = candidate box scaled by this, so nearby misses are included
+MAX_TILES = 6            # Crops per image, highest-scoring candidates first
+TILE_MERGE_IOU = 0.3     # Same-class boxes overlapping more than this are merged into one
+
+# Timing report (--report): per-stage percentiles, detections per class and bytes in/out
+REPORT_FILE = os.path.join(BASE_DIR, "censor_data", "run_report.json")
+
+# Input formats picked up from the input folder
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
 # Classes to censor - ONLY GENITALIA AND ANUS
 TARGET_CLASSES = [
     "FEMALE_GENITALIA_EXPOSED",
@@ -26,66 +80,483 @@ TARGET_CLASSES = [
     "ANUS_COVERED",
 ]
 
-def pixelate_region(image, box, padding=BOX_PADDING):
-    """Applies a mosaic pixelation effect to a specific region (box) with padding"""
-    x1, y1, width, height = box
-    
-    # Add padding to ensure full coverage
-    x1 = max(0, x1 - padding)
-    y1 = max(0, y1 - padding)
-    width = width + (padding * 2)
-    height = height + (padding * 2)
-    
-    # Ensure we don't exceed image boundaries
-    x2 = min(image.width, x1 + width)
-    y2 = min(image.height, y1 + height)
-    
-    # Recalculate width and height after boundary checks
-    width = x2 - x1
-    height = y2 - y1
-    
-    # 1. Crop the sensitive area
-    region = image.crop((x1, y1, x2, y2))
-    
-    # 2. Resize down (to lose detail)
-    small_w = max(1, int(width / PIXEL_BLOCK_SIZE))
-    small_h = max(1, int(height / PIXEL_BLOCK_SIZE))
-    region_small = region.resize((small_w, small_h), resample=Image.BILINEAR)
-    
-    # 3. Resize up (to create blocks)
-    region_pixelated = region_small.resize(region.size, resample=Image.NEAREST)
-    
-    # 4. Paste back
-    image.paste(region_pixelated, (x1, y1))
-    return image
+# --- PIXELATION ---
+# Padded boxes are snapped outward to a global PIXEL_BLOCK_SIZE grid (anchored at the image
+# origin) and the union of the blocks they cover is pixelated, so every pixel is pixelated
+# once and neighbouring regions share block edges instead of showing seams.
 
-def process_single_image(detector, in_path, out_path):
-    """Process a single image for censorship. Returns (True, num_censored) if processed successfully."""
-    try:
-        # Detect
-        detections = detector.detect(in_path)
-        
-        # Open Image
-        img = Image.open(in_path).convert("RGB")
-        censored_count = 0
+def padded_rect(box, padding, image_w, image_h):
+    """[x, y, w, h] detection box -> padded (x1, y1, x2, y2) snapped to the block grid."""
+    x, y, w, h = box
+    block = PIXEL_BLOCK_SIZE
+    x1 = max(0, x - padding) // block * block
+    y1 = max(0, y - padding) // block * block
+    x2 = min(image_w, -(-(x + w + padding) // block) * block)
+    y2 = min(image_h, -(-(y + h + padding) // block) * block)
+    return x1, y1, x2, y2
+
+def block_runs(rects, image_w, image_h):
+    """
+    The union of grid blocks covered by rects, as disjoint grid-aligned (x1, y1, x2, y2)
+    rectangles: runs of blocks along each block row, stacked with the same run in the rows below.
+    Only blocks some padded box touches are covered; a block's mean doesn't depend on how many
+    boxes hit it, so this pixelates exactly what the boxes one by one would.
+    """
+    block = PIXEL_BLOCK_SIZE
+    rows, cols = -(-image_h // block), -(-image_w // block)
+    mask = np.zeros((rows, cols), dtype=bool)
+    for x1, y1, x2, y2 in rects:
+        if x2 > x1 and y2 > y1:
+            mask[y1 // block:-(-y2 // block), x1 // block:-(-x2 // block)] = True
+
+    result = []
+    open_runs = {}  # (first col, end col) -> first row
+    for row in range(rows + 1):
+        runs = set()
+        if row < rows and mask[row].any():
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], mask[row].view(np.int8), [0]))))
+            runs = {(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])}
+        for run in [run for run in open_runs if run not in runs]:
+            first_row = open_runs.pop(run)
+            result.append((run[0] * block, first_row * block,
+                           min(image_w, run[1] * block), min(image_h, row * block)))
+        for run in runs:
+            open_runs.setdefault(run, row)
+    return result
+
+def _fill_block_means(piece, block_w, block_h):
+    """Sets every block_w x block_h block of piece to its mean. piece's size must be a multiple."""
+    height, width = piece.shape[:2]
+    # INTER_AREA with an integer factor is an exact block average; NEAREST scales it back up
+    means = cv2.resize(piece, (width // block_w, height // block_h), interpolation=cv2.INTER_AREA)
+    piece[:] = cv2.resize(means, (width, height), interpolation=cv2.INTER_NEAREST).reshape(piece.shape)
+
+def pixelate_rect(pixels, rect):
+    """Replaces every grid block inside rect with its mean colour, in place (H x W x C uint8)."""
+    x1, y1, x2, y2 = rect
+    block = PIXEL_BLOCK_SIZE
+    region = pixels[y1:y2, x1:x2]
+    height, width = region.shape[:2]
+    # Whole blocks first, then the thinner blocks where the image edge cuts the grid
+    full_h = height - height % block
+    full_w = width - width % block
+    edge_h = height - full_h
+    edge_w = width - full_w
+
+    if full_h and full_w:
+        _fill_block_means(region[:full_h, :full_w], block, block)
+    if full_h and edge_w:
+        _fill_block_means(region[:full_h, full_w:], edge_w, block)
+    if edge_h and full_w:
+        _fill_block_means(region[full_h:, :full_w], block, edge_h)
+    if edge_h and edge_w:
+        _fill_block_means(region[full_h:, full_w:], edge_w, edge_h)
+    return pixels
+
+def read_image(in_path):
+    """
+    Reads the file once and decodes it into a BGR NumPy array.
+    Same flags as cv2.imread, so NudeDetector sees exactly what detect(in_path) would.
+    Returns (pixels, content hash of the file bytes).
+    """
+    start = time.perf_counter()
+    # np.fromfile + imdecode also copes with non-ASCII paths on Windows
+    data = np.fromfile(in_path, dtype=np.uint8)
+    pixels = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if pixels is None:
+        raise ValueError("could not decode image")
+    content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if RUN_REPORT is not None:
+        RUN_REPORT.add("decode", time.perf_counter() - start)
+        RUN_REPORT.add_bytes(read=data.size)
+    return pixels, content_hash
+
+# --- DETECTION CACHE ---
+
+def default_model_file():
+    """The 320n.onnx that ships inside the nudenet package."""
+    import nudenet
+    return os.path.join(os.path.dirname(nudenet.__file__), "320n.onnx")
+
+def model_identifier(model_path=None, resolution=320):
+    """Identifies the detector weights + input size, so a new model never reuses old detections."""
+    if model_path is None:
+        model_path = default_model_file()
+    with open(model_path, "rb") as f:
+        digest = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    return f"{os.path.basename(model_path)}-{digest}-{resolution}"
+
+class DetectionCache:
+    """SQLite map of (content hash, model id) -> raw detections (class, score, box)."""
+
+    COMMIT_EVERY = 100
+
+    def __init__(self, path, model_id):
+        self.model_id = model_id
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The pipeline's model thread uses the cache, so allow cross-thread use (guarded by the lock)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS detections ("
+            "content_hash TEXT NOT NULL, model_id TEXT NOT NULL, detections TEXT NOT NULL, "
+            "PRIMARY KEY (content_hash, model_id))"
+        )
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content_hash, variant=""):
+        """variant separates detections made differently with the same model (e.g. tiled)."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT detections FROM detections WHERE content_hash = ? AND model_id = ?",
+                (content_hash, self.model_id + variant),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, content_hash, detections, variant=""):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO detections (content_hash, model_id, detections) VALUES (?, ?, ?)",
+                (content_hash, self.model_id + variant, json.dumps(detections)),
+            )
+            self.pending += 1
+            if self.pending >= self.COMMIT_EVERY:
+                self.conn.commit()
+                self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def summary(self):
+        return f"🗃️ Detection cache: {self.hits} hits, {self.misses} misses (model runs)"
+
+# --- RUN REPORT ---
+
+class RunReport:
+    """Per-image stage timings, detections per class and bytes in/out for one run. Thread-safe."""
+
+    STAGES = ("decode", "detect", "pixelate", "encode")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.timings = {stage: [] for stage in self.STAGES}
+        self.counters = {"cache_hits": 0, "bytes_read": 0, "bytes_written": 0}
+        self.detected = {}
+        self.censored = {}
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.timings[stage].append(seconds)
+
+    def add_batch(self, stage, seconds, images):
+        """A batched stage is charged to its images in equal shares."""
+        if images:
+            with self.lock:
+                self.timings[stage].extend([seconds / images] * images)
+
+    def add_bytes(self, read=0, written=0):
+        with self.lock:
+            self.counters["bytes_read"] += read
+            self.counters["bytes_written"] += written
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def count_classes(self, detections, censored_labels):
+        with self.lock:
+            for detection in detections:
+                self.detected[detection["class"]] = self.detected.get(detection["class"], 0) + 1
+            for label in censored_labels:
+                self.censored[label] = self.censored.get(label, 0) + 1
+
+    def summary(self, processed, failed, settings):
+        wall = time.perf_counter() - self.started
+        stages = {}
+        for stage, values in self.timings.items():
+            ms = np.array(values) * 1000
+            stages[stage] = {
+                "images": len(values),
+                "total_seconds": round(float(ms.sum()) / 1000, 3),
+                "mean_ms": round(float(ms.mean()), 2) if len(ms) else None,
+                "p50_ms": round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+                "p95_ms": round(float(np.percentile(ms, 95)), 2) if len(ms) else None,
+                "p99_ms": round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+            }
+        return {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "images_processed": processed,
+            "images_failed": failed,
+            "wall_seconds": round(wall, 3),
+            "images_per_second": round(processed / wall, 2) if wall else None,
+            "stages": stages,
+            "cache_hits": self.counters["cache_hits"],
+            "detections_per_class": dict(sorted(self.detected.items())),
+            "censored_per_class": dict(sorted(self.censored.items())),
+            "bytes_read": self.counters["bytes_read"],
+            "bytes_written": self.counters["bytes_written"],
+            "settings": settings,
+        }
+
+    def write(self, path, processed, failed, settings):
+        """Writes the JSON summary and returns a one-line digest for the console."""
+        summary = self.summary(processed, failed, settings)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        busiest = max(self.STAGES, key=lambda stage: summary["stages"][stage]["total_seconds"])
+        return (f"📝 Timing report: {path} | {summary['images_per_second']} img/s, "
+                f"most time in {busiest} ({summary['stages'][busiest]['total_seconds']:.1f}s)")
+
+# Set while a --report run is going; the stage functions record into it
+RUN_REPORT = None
+
+def report_settings(args):
+    """The knobs that shape performance, stored alongside the timings."""
+    names = ("batch_size", "pipeline", "io_threads", "workers", "tiled", "no_cache",
+             "int8", "intra_threads", "inter_threads", "graph_opt")
+    settings = {name: getattr(args, name) for name in names if hasattr(args, name)}
+    settings["cpu_count"] = os.cpu_count()
+    return settings
+
+def run_detector(detector, images):
+    """One forward pass for a list of BGR arrays (a single image skips the batch path)."""
+    if len(images) == 1:
+        return [detector.detect(images[0])]
+    if images:
+        # One forward pass; NudeNet splits the outputs back per image
+        return detector.detect_batch(images, batch_size=len(images))
+    return []
+
+def detect_images(detector, decoded, cache=None, tiled=False):
+    """
+    Detections for a list of (pixels, content_hash). Cached images skip the model;
+    the rest go through it as a single batch. Returns one detection list per image.
+    """
+    variant = tiling_variant() if tiled else ""
+    results = [None] * len(decoded)
+    misses = []
+    for i, (pixels, content_hash) in enumerate(decoded):
+        cached = cache.get(content_hash, variant) if cache is not None else None
+        if cached is None:
+            misses.append(i)
+        else:
+            results[i] = cached
+
+    start = time.perf_counter()
+    fresh = run_detector(detector, [decoded[i][0] for i in misses])
+    if tiled:
+        fresh = refine_with_tiles(detector, [decoded[i][0] for i in misses], fresh)
+    if RUN_REPORT is not None:
+        RUN_REPORT.add_batch("detect", time.perf_counter() - start, len(misses))
+        RUN_REPORT.count("cache_hits", len(decoded) - len(misses))
+
+    for i, detections in zip(misses, fresh):
+        results[i] = detections
+        if cache is not None:
+            cache.put(decoded[i][1], detections, variant)
+    return results
+
+# --- TWO-PASS (TILED) DETECTION ---
+
+TILE_STATS = {"images": 0, "tiles": 0, "added": 0}
+
+def tiling_variant():
+    """Cache variant for tiled detections; changes whenever a tiling setting does."""
+    return f"/tiled-{TILE_MIN_SIDE}-{TILE_SIZE}-{TILE_MIN_SCORE}-{TILE_CONTEXT}-{MAX_TILES}-{TILE_MERGE_IOU}"
+
+def candidate_tiles(detections, image_w, image_h):
+    """
+    Crops (x1, y1, x2, y2) around the first-pass TARGET_CLASSES detections scoring at least
+    TILE_MIN_SCORE, best scores first. Other classes would spend MAX_TILES on regions that are
+    never censored. Crops mostly covered by an already chosen one are dropped.
+    """
+    candidates = [d for d in detections if d["class"] in TARGET_CLASSES and d["score"] >= TILE_MIN_SCORE]
+    tiles = []
+    for detection in sorted(candidates, key=lambda d: d["score"], reverse=True):
+        x, y, w, h = detection["box"]
+        side_w = min(image_w, max(TILE_SIZE, int(w * TILE_CONTEXT)))
+        side_h = min(image_h, max(TILE_SIZE, int(h * TILE_CONTEXT)))
+        # Center on the box, then shift back inside the image
+        x1 = min(max(0, x + w // 2 - side_w // 2), image_w - side_w)
+        y1 = min(max(0, y + h // 2 - side_h // 2), image_h - side_h)
+        tile = (x1, y1, x1 + side_w, y1 + side_h)
+
+        if any(overlap_ratio(tile, kept) > 0.7 for kept in tiles):
+            continue
+        tiles.append(tile)
+        if len(tiles) >= MAX_TILES:
+            break
+    return tiles
+
+def overlap_ratio(a, b):
+    """Share of rectangle a (x1, y1, x2, y2) that lies inside b."""
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    return (w * h) / ((a[2] - a[0]) * (a[3] - a[1]))
+
+def box_iou(a, b):
+    """IoU of two [x, y, w, h] boxes."""
+    w = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    h = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / (a[2] * a[3] + b[2] * b[3] - inter)
+
+def merge_detections(detections):
+    """
+    Merges same-class boxes overlapping more than TILE_MERGE_IOU. The merged box is their
+    union (censoring a bit more beats leaving an edge uncovered) with the best score.
+    """
+    merged = []
+    for detection in sorted(detections, key=lambda d: d["score"], reverse=True):
+        for kept in merged:
+            if kept["class"] == detection["class"] and box_iou(kept["box"], detection["box"]) > TILE_MERGE_IOU:
+                kx, ky, kw, kh = kept["box"]
+                x, y, w, h = detection["box"]
+                x1, y1 = min(kx, x), min(ky, y)
+                kept["box"] = [x1, y1, max(kx + kw, x + w) - x1, max(ky + kh, y + h) - y1]
+                break
+        else:
+            merged.append(dict(detection, box=list(detection["box"])))
+    return merged
+
+def refine_with_tiles(detector, images, first_pass):
+    """
+    Second pass: re-runs the detector on source-resolution crops around the first-pass
+    candidates of large images (all crops of the batch in one call), maps the boxes back
+    to image coordinates and merges them with the first pass.
+    """
+    crops = []
+    owners = []
+    for i, (pixels, detections) in enumerate(zip(images, first_pass)):
+        image_h, image_w = pixels.shape[:2]
+        if max(image_w, image_h) <= TILE_MIN_SIDE:
+            continue
+        tiles = candidate_tiles(detections, image_w, image_h)
+        if not tiles:
+            continue
+        TILE_STATS["images"] += 1
+        for x1, y1, x2, y2 in tiles:
+            crops.append(np.ascontiguousarray(pixels[y1:y2, x1:x2]))
+            owners.append((i, x1, y1))
+
+    if not crops:
+        return first_pass
+    TILE_STATS["tiles"] += len(crops)
 
+    combined = [list(detections) for detections in first_pass]
+    for (i, x_off, y_off), detections in zip(owners, run_detector(detector, crops)):
         for detection in detections:
-            label = detection['class']
-            score = detection['score']
-            box = detection['box']  # [x, y, w, h]
+            x, y, w, h = detection["box"]
+            combined[i].append(dict(detection, box=[x + x_off, y + y_off, w, h]))
 
-            # If it's a sensitive part and confidence meets threshold
-            if label in TARGET_CLASSES and score > CONFIDENCE_THRESHOLD:
-                img = pixelate_region(img, box)
-                censored_count += 1
+    results = []
+    for i, detections in enumerate(combined):
+        if len(detections) == len(first_pass[i]):
+            results.append(first_pass[i])
+            continue
+        merged = merge_detections(detections)
+        TILE_STATS["added"] += max(0, len(merged) - len(first_pass[i]))
+        results.append(merged)
+    return results
 
-        # Save the image (whether censored or clean)
-        img.save(out_path, quality=95)
-        return True, censored_count
+def tile_stats_summary(stats=None):
+    stats = stats or TILE_STATS
+    return (f"🔍 Tiled pass: {stats['images']} images re-checked with {stats['tiles']} crops, "
+            f"{stats['added']} extra regions found")
 
+def censor_and_save(pixels, detections, out_path):
+    """Pixelates the target detections on a decoded BGR image and saves it. Returns the censored count."""
+    start = time.perf_counter()
+    rgb = cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+    image_h, image_w = rgb.shape[:2]
+    rects = []
+    censored_labels = []
+
+    for detection in detections:
+        label = detection['class']
+        score = detection['score']
+        box = detection['box']  # [x, y, w, h]
+
+        # If it's a sensitive part and confidence meets threshold
+        if label in TARGET_CLASSES and score > CONFIDENCE_THRESHOLD:
+            rects.append(padded_rect(box, BOX_PADDING, image_w, image_h))
+            censored_labels.append(label)
+
+    # Overlapping padded boxes are pixelated once, block by block over their union
+    for rect in block_runs(rects, image_w, image_h):
+        pixelate_rect(rgb, rect)
+    pixelated = time.perf_counter()
+
+    # Save the image (whether censored or clean)
+    Image.fromarray(rgb).save(out_path, quality=95)
+    censored_count = len(rects)
+
+    if RUN_REPORT is not None:
+        RUN_REPORT.add("pixelate", pixelated - start)
+        RUN_REPORT.add("encode", time.perf_counter() - pixelated)
+        RUN_REPORT.add_bytes(written=os.path.getsize(out_path))
+        RUN_REPORT.count_classes(detections, censored_labels)
+    return censored_count
+
+def process_batch(detector, batch, cache=None, tiled=False):
+    """
+    Censors a batch of (in_path, out_path) jobs with a single inference call.
+    Returns one (job, success, num_censored or error) per job, in order.
+    """
+    results = [None] * len(batch)
+    indices = []
+    decoded = []
+    for i, job in enumerate(batch):
+        try:
+            decoded.append(read_image(job[0]))
+            indices.append(i)
+        except Exception as e:
+            results[i] = (job, False, e)
+
+    if not decoded:
+        return results
+
+    try:
+        all_detections = detect_images(detector, decoded, cache, tiled)
     except Exception as e:
-        tqdm.write(f"❌ Error on {os.path.basename(in_path)}: {e}")
-        return False, 0
+        if len(decoded) > 1:
+            tqdm.write(f"⚠️ Batch inference failed ({e}), retrying images one by one...")
+        all_detections = []
+        for i, item in zip(indices, decoded):
+            try:
+                all_detections.append(detect_images(detector, [item], cache, tiled)[0])
+            except Exception as inner:
+                results[i] = (batch[i], False, inner)
+                all_detections.append(None)
+
+    for i, (pixels, _), detections in zip(indices, decoded, all_detections):
+        if detections is None:
+            continue
+        try:
+            results[i] = (batch[i], True, censor_and_save(pixels, detections, batch[i][1]))
+        except Exception as e:
+            results[i] = (batch[i], False, e)
+    return results
 
 def detect_mode(input_folder):
     """
@@ -102,99 +573,281 @@ def detect_mode(input_folder):
     except Exception:
         return 'flat'
 
-def process_flat_mode(detector):
+def iter_results(detector, jobs, args, cache=None, stats=None):
     """
-    Flat mode: Process images directly in input folder.
+    Censors (in_path, out_path) jobs in the mode selected by args and yields
+    (job, success, num_censored or error) as each one finishes.
     """
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    
-    if not files:
-        print(f"⚠️ No images found in: {INPUT_FOLDER}")
-        return 0, 0
+    if args.pipeline:
+        # Pipeline items are (pixels, content_hash) pairs from read_image
+        def detect_many(decoded):
+            return detect_images(detector, decoded, cache, args.tiled)
 
-    print(f"🚀 Processing {len(files)} images (Flat Mode)...")
-    
+        def finish(decoded, detections, out_path):
+            return censor_and_save(decoded[0], detections, out_path)
+
+        yield from run_pipeline(jobs, read_image, detect_many, finish,
+                                batch_size=args.batch_size, io_threads=args.io_threads,
+                                workers=args.workers, queue_size=QUEUE_SIZE, stats=stats)
+    else:
+        for start in range(0, len(jobs), args.batch_size):
+            yield from process_batch(detector, jobs[start:start + args.batch_size], cache, args.tiled)
+
+def run_jobs(detector, jobs, args, cache=None):
+    """Censors a list of (in_path, out_path) jobs behind a single progress bar."""
+    global RUN_REPORT
     total_processed = 0
     total_censored = 0
+    stats = PipelineStats() if args.pipeline else None
+    RUN_REPORT = RunReport() if args.report else None
     
-    for filename in tqdm(files, desc="Censoring", unit="img", ncols=80):
-        in_path = os.path.join(INPUT_FOLDER, filename)
-        # Add _censored suffix before extension
-        name_without_ext = os.path.splitext(filename)[0]
-        ext = os.path.splitext(filename)[1]
-        out_filename = f"{name_without_ext}_censored{ext}"
-        out_path = os.path.join(OUTPUT_FOLDER, out_filename)
-        
-        success, count = process_single_image(detector, in_path, out_path)
-        if success:
-            total_processed += 1
-            total_censored += count
+    with tqdm(total=len(jobs), desc="Censoring", unit="img", ncols=80) as pbar:
+        for (in_path, out_path), success, result in iter_results(detector, jobs, args, cache, stats):
+            if success:
+                total_processed += 1
+                total_censored += result
+            else:
+                tqdm.write(f"❌ Error on {os.path.basename(in_path)}: {result}")
+            pbar.update(1)
 
+    if stats is not None:
+        print(stats.summary(args.io_threads, args.workers))
+    if args.tiled:
+        print(tile_stats_summary())
+    if RUN_REPORT is not None:
+        print(RUN_REPORT.write(args.report, total_processed, len(jobs) - total_processed, report_settings(args)))
+        RUN_REPORT = None
     return total_processed, total_censored
 
-def process_recursive_mode(detector):
+# --- MODEL LOADING & DAEMON CLIENT ---
+
+GRAPH_OPT_LEVELS = ("disabled", "basic", "extended", "all")
+SESSION_ARGS = ("int8", "intra_threads", "inter_threads", "graph_opt")
+
+def session_settings(args):
+    """The flags fixed when the model session is built (the daemon can't change them per request)."""
+    return {name: getattr(args, name) for name in SESSION_ARGS}
+
+def describe_session(session):
+    return (f"{'int8' if session.get('int8') else 'standard'} model, "
+            f"{session.get('intra_threads') or 'auto'} intra / {session.get('inter_threads') or 'auto'} inter threads, "
+            f"graph optimization {session.get('graph_opt')}")
+
+def model_file(args):
+    return QUANTIZED_MODEL_FILE if args.int8 else default_model_file()
+
+def session_options(args):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = args.intra_threads
+    options.inter_op_num_threads = args.inter_threads
+    options.graph_optimization_level = {
+        "disabled": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[args.graph_opt]
+    return options
+
+def load_detector(args):
+    # Imported here so runs served by the daemon never pay for loading nudenet/onnxruntime
+    import onnxruntime
+    from nudenet import NudeDetector
+
+    if args.int8 and not os.path.exists(QUANTIZED_MODEL_FILE):
+        print("⚠️ No int8 model yet (run quantize_model.py). Using the standard model.")
+        args.int8 = False
+
+    print("⏳ Loading NudeNet AI Model (This might take a moment)...")
+    path = model_file(args)
+    if args.intra_threads or args.inter_threads or args.graph_opt != "all":
+        # NudeDetector has no session options of its own and its __init__ always builds a
+        # default session, so skip __init__ and set up the same fields on a tuned one
+        detector = NudeDetector.__new__(NudeDetector)
+        detector.onnx_session = onnxruntime.InferenceSession(
+            path, sess_options=session_options(args), providers=["CPUExecutionProvider"])
+        detector.input_width = detector.input_height = 320  # NudeDetector's default inference_resolution
+        detector.input_name = detector.onnx_session.get_inputs()[0].name
+    else:
+        detector = NudeDetector(model_path=path)
+    print(f"✅ Model loaded! ({os.path.basename(path)})")
+    return detector
+
+def open_cache(args, detector):
+    if args.no_cache:
+        return None
+    return DetectionCache(DETECTION_CACHE_FILE, model_identifier(model_file(args), detector.input_width))
+
+def add_session_args(parser):
+    """Model/session flags shared by censor_tool.py and censor_daemon.py."""
+    parser.add_argument("--int8", action="store_true",
+                        help="Use the int8-quantized model written by quantize_model.py")
+    parser.add_argument("--intra-threads", type=int, default=ORT_INTRA_OP_THREADS,
+                        help=f"ONNX Runtime threads inside an operator (default: {ORT_INTRA_OP_THREADS} = all cores)")
+    parser.add_argument("--inter-threads", type=int, default=ORT_INTER_OP_THREADS,
+                        help=f"ONNX Runtime threads across operators (default: {ORT_INTER_OP_THREADS} = auto)")
+    parser.add_argument("--graph-opt", choices=GRAPH_OPT_LEVELS, default=ORT_GRAPH_OPTIMIZATION,
+                        help=f"ONNX Runtime graph optimization level (default: {ORT_GRAPH_OPTIMIZATION})")
+
+def current_settings():
+    """Censor settings sent along with daemon requests, so edits to this file apply immediately."""
+    return {
+        "PIXEL_BLOCK_SIZE": PIXEL_BLOCK_SIZE,
+        "CONFIDENCE_THRESHOLD": CONFIDENCE_THRESHOLD,
+        "BOX_PADDING": BOX_PADDING,
+        "TARGET_CLASSES": TARGET_CLASSES,
+        "TILE_MIN_SIDE": TILE_MIN_SIDE,
+        "TILE_SIZE": TILE_SIZE,
+        "TILE_MIN_SCORE": TILE_MIN_SCORE,
+        "TILE_CONTEXT": TILE_CONTEXT,
+        "MAX_TILES": MAX_TILES,
+        "TILE_MERGE_IOU": TILE_MERGE_IOU,
+    }
+
+def submit_to_daemon(jobs, args):
     """
-    Recursive mode: Preserve folder structure with _censored suffix on folders.
+    Streams jobs through a running censor_daemon.py.
+    Returns (processed, censored, unfinished_jobs), or None if no daemon is reachable.
     """
-    # First, count total images for progress bar
-    total_images = 0
-    for root, dirs, files in os.walk(INPUT_FOLDER):
-        image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        total_images += len(image_files)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(args.socket):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(args.socket)
+    except OSError:
+        sock.close()
+        print("⚠️ Censor daemon not answering, running in-process.")
+        return None
+
+    print("🔌 Connected to censor daemon (model already loaded)")
+    request = {
+        "jobs": jobs,
+        "session": session_settings(args),
+        "settings": current_settings(),
+        "options": {name: getattr(args, name)
+                    for name in ("batch_size", "pipeline", "io_threads", "workers", "no_cache", "tiled", "report")},
+    }
+
+    total_processed = 0
+    total_censored = 0
+    unfinished = {in_path: (in_path, out_path) for in_path, out_path in jobs}
+    summary = None
+    with sock, sock.makefile("rwb") as stream:
+        stream.write((json.dumps(request) + "\n").encode("utf-8"))
+        stream.flush()
+        with tqdm(total=len(jobs), desc="Censoring", unit="img", ncols=80) as pbar:
+            for line in stream:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    break  # Line cut off by a dying daemon: run what's left in-process
+                if "refused" in message:
+                    print(f"⚠️ Censor daemon refused the run ({message['refused']}), running in-process.")
+                    return None
+                if message.get("done"):
+                    summary = message.get("summary", [])
+                    break
+                unfinished.pop(message["in"], None)
+                if message["ok"]:
+                    total_processed += 1
+                    total_censored += message["censored"]
+                else:
+                    tqdm.write(f"❌ Error on {os.path.basename(message['in'])}: {message['error']}")
+                pbar.update(1)
+
+    if summary is None:
+        print(f"⚠️ Lost the censor daemon with {len(unfinished)} images left.")
+    else:
+        for line in summary:
+            print(line)
+    return total_processed, total_censored, list(unfinished.values())
+
+def dispatch_jobs(jobs, args):
+    """Runs jobs on the censor daemon if one is up, otherwise (or for leftovers) in this process."""
+    total_processed = 0
+    total_censored = 0
+    if not args.no_daemon:
+        submitted = submit_to_daemon(jobs, args)
+        if submitted is not None:
+            total_processed, total_censored, jobs = submitted
+            if not jobs:
+                return total_processed, total_censored
+
+    detector = load_detector(args)
+    cache = open_cache(args, detector)
+    try:
+        processed, censored = run_jobs(detector, jobs, args, cache)
+    finally:
+        if cache is not None:
+            print(cache.summary())
+            cache.close()
+    return total_processed + processed, total_censored + censored
+
+def process_flat_mode(args):
+    """
+    Flat mode: Process images directly in input folder.
+    """
+    # Add _censored suffix before extension
+    jobs = list(iter_jobs(INPUT_FOLDER, OUTPUT_FOLDER, "_censored", IMAGE_EXTENSIONS, recursive=False))
     
-    if total_images == 0:
-        print(f"⚠️ No images found in subdirectories")
+    if not jobs:
+        print(f"⚠️ No images found in: {INPUT_FOLDER}")
         return 0, 0
+
+    print(f"🚀 Processing {len(jobs)} images (Flat Mode)...")
     
-    print(f"🚀 Processing {total_images} images across folders (Recursive Mode)...")
+    return dispatch_jobs(jobs, args)
+
+def process_recursive_mode(args):
+    """
+    Recursive mode: Preserve folder structure with _censored suffix on folders.
+    """
+    # Add _censored suffix to the top-level folder and to each filename
+    jobs = list(iter_jobs(INPUT_FOLDER, OUTPUT_FOLDER, "_censored", IMAGE_EXTENSIONS))
     
-    total_processed = 0
-    total_censored = 0
+    if not jobs:
+        print(f"⚠️ No images found in subdirectories")
+        return 0, 0
     
-    # Create progress bar
-    with tqdm(total=total_images, desc="Censoring", unit="img", ncols=80) as pbar:
-        # Walk through all subdirectories in input folder
-        for root, dirs, files in os.walk(INPUT_FOLDER):
-            # Calculate relative path from input folder
-            rel_path = os.path.relpath(root, INPUT_FOLDER)
-            
-            # Skip if we're at the root level (no subdirectories to process)
-            if rel_path == '.':
-                continue
-            
-            # Split the relative path to add _censored suffix to the top-level folder
-            path_parts = rel_path.split(os.sep)
-            if len(path_parts) > 0:
-                # Add _censored suffix to the top-level folder only
-                path_parts[0] = path_parts[0] + '_censored'
-            
-            # Reconstruct the output path
-            output_rel_path = os.sep.join(path_parts)
-            output_dir = os.path.join(OUTPUT_FOLDER, output_rel_path)
-            
-            # Create output directory structure
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Process all image files in this directory
-            image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-            
-            for filename in image_files:
-                in_path = os.path.join(root, filename)
-                # Add _censored suffix to filename before extension
-                name_without_ext = os.path.splitext(filename)[0]
-                ext = os.path.splitext(filename)[1]
-                out_filename = f"{name_without_ext}_censored{ext}"
-                out_path = os.path.join(output_dir, out_filename)
-                
-                success, count = process_single_image(detector, in_path, out_path)
-                if success:
-                    total_processed += 1
-                    total_censored += count
-                pbar.update(1)
+    print(f"🚀 Processing {len(jobs)} images across folders (Recursive Mode)...")
     
-    return total_processed, total_censored
+    return dispatch_jobs(jobs, args)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pixelate NudeNet detections in every image in censor_data/input.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"Images per inference call (default: {BATCH_SIZE})")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap decoding, inference and pixelate/save in separate threads")
+    parser.add_argument("--io-threads", type=int, default=IO_THREADS,
+                        help=f"Decode threads in --pipeline mode (default: {IO_THREADS})")
+    parser.add_argument("--workers", type=int, default=CENSOR_WORKERS,
+                        help=f"Pixelate/save threads in --pipeline mode (default: {CENSOR_WORKERS})")
+    parser.add_argument("--tiled", action="store_true",
+                        help=f"Re-check big images (> {TILE_MIN_SIDE}px) at full resolution around first-pass hits")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore the detection cache and run the model on every image")
+    parser.add_argument("--report", nargs="?", const=REPORT_FILE, default=None, metavar="PATH",
+                        help="Write per-stage timings, detections per class and bytes in/out as JSON "
+                             "(default path: censor_data/run_report.json)")
+    add_session_args(parser)
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Don't use a running censor_daemon.py; always load the model here")
+    parser.add_argument("--socket", default=DAEMON_SOCKET,
+                        help="Unix socket of the censor daemon (default: censor_data/.censor_daemon.sock)")
+    args = parser.parse_args(argv)
+    args.batch_size = max(1, args.batch_size)
+    args.io_threads = max(1, args.io_threads)
+    args.workers = max(1, args.workers)
+    args.intra_threads = max(0, args.intra_threads)
+    args.inter_threads = max(0, args.inter_threads)
+    return args
 
 def main():
+    args = parse_args()
+
     print("--- 🔞 Aggressive NudeNet Censor Tool ---")
     print("⚡ AGGRESSIVE MODE: Low threshold (8%), Large padding (70px)")
     
@@ -208,9 +861,15 @@ def main():
     if not os.path.exists(OUTPUT_FOLDER):
         os.makedirs(OUTPUT_FOLDER)
 
-    print("⏳ Loading NudeNet AI Model (This might take a moment)...")
-    detector = NudeDetector()
-    print("✅ Model loaded!")
+    if args.batch_size > 1:
+        print(f"📦 Batch size: {args.batch_size}")
+    if args.intra_threads or args.inter_threads or args.graph_opt != "all":
+        print(f"🧮 ONNX Runtime: {args.intra_threads or 'auto'} intra / {args.inter_threads or 'auto'} inter threads, "
+              f"graph optimization: {args.graph_opt}")
+    if args.tiled:
+        print(f"🔍 Tiled detection: images over {TILE_MIN_SIDE}px get a full-resolution second pass")
+    if args.pipeline:
+        print(f"🧵 Pipeline: {args.io_threads} decode → 1 model → {args.workers} censor threads")
 
     # Auto-detect mode
     mode = detect_mode(INPUT_FOLDER)
@@ -218,9 +877,9 @@ def main():
     
     # Process based on detected mode
     if mode == 'flat':
-        processed, censored = process_flat_mode(detector)
+        processed, censored = process_flat_mode(args)
     else:  # recursive
-        processed, censored = process_recursive_mode(detector)
+        processed, censored = process_recursive_mode(args)
     
     if processed > 0:
         print(f"\n✨ SUCCESS!")
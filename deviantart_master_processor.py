@@ -3,6 +3,7 @@ import shutil
 import random
 import datetime
 from PIL import Image
+from image_utils import get_logo_variant, logo_cache_summary, composite_logo
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -36,6 +37,7 @@ LOGO_SCALE = 0.45
 OPACITY = 215           
 PADDING_X = 15          
 PADDING_Y = 10          
+LOGO_CACHE_DIR = os.path.join(BASE_DIR, "watermark_data", ".logo_cache")  # Shared with watermark_logo.py
 
 # --- TRAFFIC OPTIMIZED TAG DATABASE (Cleaned based on your files) ---
 TAG_DB = {
@@ -247,22 +249,15 @@ def get_start_date():
 
 def apply_watermark(image_path, save_path, watermark_img):
     try:
-        base_image = Image.open(image_path).convert("RGBA")
+        base_image = Image.open(image_path)
         base_w, base_h = base_image.size
-        logo_aspect = watermark_img.width / watermark_img.height
         new_logo_w = int(base_w * LOGO_SCALE)
-        new_logo_h = int(new_logo_w / logo_aspect)
-        resized_logo = watermark_img.resize((new_logo_w, new_logo_h), Image.Resampling.LANCZOS)
-        if OPACITY < 255:
-            r, g, b, alpha = resized_logo.split()
-            alpha = alpha.point(lambda p: p * (OPACITY / 255))
-            resized_logo = Image.merge("RGBA", (r, g, b, alpha))
+        resized_logo = get_logo_variant(watermark_img, new_logo_w, OPACITY, LOGO_CACHE_DIR)
+        new_logo_h = resized_logo.height
         x_pos = PADDING_X
         y_pos = base_h - new_logo_h - PADDING_Y
-        transparent_layer = Image.new("RGBA", base_image.size, (0, 0, 0, 0))
-        transparent_layer.paste(resized_logo, (x_pos, y_pos), mask=resized_logo)
-        final = Image.alpha_composite(base_image, transparent_layer)
-        final.convert("RGB").save(save_path, "JPEG", quality=95)
+        final = composite_logo(base_image, resized_logo, x_pos, y_pos)
+        final.save(save_path, "JPEG", quality=95)
         return True
     except Exception as e:
         print(f"❌ Error applying watermark: {e}")
@@ -391,6 +386,7 @@ def main():
     print(f"✨ DONE! Batch created: {batch_folder_name}")
     print(f"📄 Helper files created inside each Day Folder.")
     print("📁 Used images moved to '4_Archived'")
+    print(logo_cache_summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
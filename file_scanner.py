@@ -0,0 +1,59 @@
+import os
+
+# --- SHARED INPUT SCANNER ---
+# One os.scandir pass over the input tree. Used by watermark_logo.py and censor_tool.py.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+def iter_image_entries(input_root, extensions=IMAGE_EXTENSIONS, recursive=True):
+    """
+    Yields (rel_dir, DirEntry) for every image under input_root.
+    rel_dir is '' for files at the root. Folders are yielded as (rel_dir, None)
+    the first time they are entered, so callers can mirror empty folders too.
+    """
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        if rel_dir:
+            yield rel_dir, None
+        with os.scandir(os.path.join(input_root, rel_dir)) as it:
+            subdirs = []
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subdirs.append(os.path.join(rel_dir, entry.name))
+                elif entry.name.lower().endswith(extensions):
+                    yield rel_dir, entry
+        # Reverse so folders come off the stack in listing order
+        stack.extend(reversed(subdirs))
+
+def iter_jobs(input_root, output_root, suffix, extensions=IMAGE_EXTENSIONS, out_ext=None, recursive=True):
+    """
+    Yields (in_path, out_path) jobs from a single scan of input_root.
+
+    Flat (recursive=False): images directly in input_root -> output_root/<name><suffix><ext>
+    Recursive: images inside subfolders only. The top-level folder gets the suffix too:
+        input/Set/Sub/a.png -> output/Set<suffix>/Sub/a<suffix><ext>
+    out_ext forces the output extension (e.g. ".jpg"); None keeps the input's.
+    Output folders are created as they are reached.
+    """
+    output_dirs = {}
+    for rel_dir, entry in iter_image_entries(input_root, extensions, recursive):
+        if recursive and not rel_dir:
+            continue  # Root-level files are only processed in flat mode
+
+        output_dir = output_dirs.get(rel_dir)
+        if output_dir is None:
+            path_parts = rel_dir.split(os.sep) if rel_dir else []
+            if path_parts:
+                path_parts[0] = path_parts[0] + suffix
+            output_dir = os.path.join(output_root, *path_parts)
+            os.makedirs(output_dir, exist_ok=True)
+            output_dirs[rel_dir] = output_dir
+
+        if entry is None:
+            continue
+
+        name_without_ext, ext = os.path.splitext(entry.name)
+        out_filename = f"{name_without_ext}{suffix}{out_ext or ext}"
+        yield entry.path, os.path.join(output_dir, out_filename)
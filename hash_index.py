@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+# --- STREAMING FILE HASHING ---
+# Files are hashed in fixed-size chunks, so memory stays flat however big the image is.
+# blake2b is faster than MD5 on 64-bit CPUs; "md5" still works for the old digests.
+HASH_ALGORITHM = "blake2b"
+HASH_CHUNK_SIZE = 1024 * 1024   # 1 MB reads
+HASH_WORKERS = 8                # Parallel hashing threads (hashlib and file reads release the GIL)
+
+def hash_file(file_path, algorithm=HASH_ALGORITHM, chunk_size=HASH_CHUNK_SIZE):
+    """Hex digest of a file, read in chunks into one reused buffer."""
+    digest = hashlib.blake2b(digest_size=16) if algorithm == "blake2b" else hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+# --- PERSISTENT CONTENT-HASH INDEX ---
+# Remembers each file's content hash keyed by (path, size, mtime), so the schedulers only
+# hash files that are new or changed since the last run instead of the whole archive.
+# Used by auto_scheduler.py and auto_scheduler_waifu.py.
+
+class HashIndex:
+    """
+    SQLite map of path -> (size, mtime_ns, algorithm, hash). Entries whose size/mtime changed,
+    or that were made with another algorithm (e.g. old MD5 rows), are re-hashed on lookup.
+    """
+
+    COMMIT_EVERY = 200
+
+    def __init__(self, path, algorithm=HASH_ALGORITHM, workers=HASH_WORKERS):
+        self.algorithm = algorithm
+        self.workers = workers
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL, "
+            "algo TEXT NOT NULL DEFAULT 'md5')"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(files)")]
+        if "algo" not in columns:
+            # Indexes written before the algo column only ever held MD5 digests
+            self.conn.execute("ALTER TABLE files ADD COLUMN algo TEXT NOT NULL DEFAULT 'md5'")
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_path):
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def lookup(self, file_path):
+        """(stat, indexed hash or None if the file must be hashed)."""
+        st = os.stat(file_path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, algo, hash FROM files WHERE path = ?", (self.key(file_path),)
+        ).fetchone()
+        if row is not None and row[:3] == (st.st_size, st.st_mtime_ns, self.algorithm):
+            return st, row[3]
+        return st, None
+
+    def store(self, file_path, st, digest):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, algo) VALUES (?, ?, ?, ?, ?)",
+            (self.key(file_path), st.st_size, st.st_mtime_ns, digest, self.algorithm),
+        )
+        self._written()
+
+    def get_many(self, file_paths):
+        """
+        {path: hash} for many files. Indexed ones are answered from SQLite; the rest are
+        hashed on a thread pool (reads are I/O-bound) and written back from this thread.
+        """
+        results = {}
+        missing = []
+        for file_path in file_paths:
+            st, digest = self.lookup(file_path)
+            if digest is None:
+                missing.append((file_path, st))
+            else:
+                results[file_path] = digest
+        self.hits += len(results)
+        self.misses += len(missing)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+                digests = pool.map(lambda item: hash_file(item[0], self.algorithm), missing)
+                for (file_path, st), digest in zip(missing, digests):
+                    self.store(file_path, st, digest)
+                    results[file_path] = digest
+        return results
+
+    def rename(self, old_path, new_path):
+        """Moves an entry after os.rename (size and mtime survive a rename, so the hash does too)."""
+        self.conn.execute("DELETE FROM files WHERE path = ?", (self.key(new_path),))
+        self.conn.execute("UPDATE files SET path = ? WHERE path = ?", (self.key(new_path), self.key(old_path)))
+        self._written()
+
+    def prune(self, folder, names):
+        """Drops entries for files in folder that are no longer there. names = current listing."""
+        prefix = self.key(folder) + os.sep
+        present = {self.key(os.path.join(folder, name)) for name in names}
+        stale = [
+            (path,) for (path,) in self.conn.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            if path not in present and os.sep not in path[len(prefix):]
+        ]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", stale)
+        self._written()
+        return len(stale)
+
+    def _written(self):
+        self.pending += 1
+        if self.pending >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def summary(self):
+        return f"🗂️ Hash index: {self.hits} unchanged files skipped, {self.misses} hashed ({self.algorithm})"
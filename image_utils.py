@@ -0,0 +1,261 @@
+import os
+import time
+import hashlib
+import multiprocessing
+from itertools import islice
+from collections import OrderedDict, deque
+from PIL import Image
+
+# --- LOGO VARIANT CACHE ---
+# Resized + opacity-adjusted logos, keyed by (logo fingerprint, target width, opacity).
+# Most batches share a handful of widths, so the LANCZOS resize only runs once per width.
+LOGO_CACHE_SIZE = 32    # Max variants kept in memory (least recently used are dropped)
+
+LOGO_CACHE_STATS = {"hits": 0, "disk_hits": 0, "misses": 0, "build_seconds": 0.0}
+
+_logo_variants = OrderedDict()
+_logo_fingerprints = {}
+
+def logo_fingerprint(watermark_img):
+    """Short content hash of a loaded logo. Computed once per image object."""
+    entry = _logo_fingerprints.get(id(watermark_img))
+    if entry is None or entry[0] is not watermark_img:
+        digest = hashlib.md5(watermark_img.tobytes())
+        digest.update(f"{watermark_img.mode}{watermark_img.size}".encode())
+        # Keep a reference so the id() can't be reused by another image
+        entry = (watermark_img, digest.hexdigest()[:16])
+        _logo_fingerprints[id(watermark_img)] = entry
+    return entry[1]
+
+def build_logo_variant(watermark_img, target_w, opacity):
+    """Resize the logo to target_w (keeping aspect) and apply the opacity to its alpha."""
+    logo_aspect = watermark_img.width / watermark_img.height
+    new_logo_h = int(target_w / logo_aspect)
+    resized_logo = watermark_img.resize((target_w, new_logo_h), Image.Resampling.LANCZOS)
+
+    if opacity < 255:
+        r, g, b, alpha = resized_logo.split()
+        alpha = alpha.point(lambda p: p * (opacity / 255))
+        resized_logo = Image.merge("RGBA", (r, g, b, alpha))
+
+    return resized_logo
+
+def get_logo_variant(watermark_img, target_w, opacity, cache_dir=None):
+    """
+    Returns the resized, opacity-adjusted logo for target_w.
+    Looks in the in-memory LRU first, then cache_dir (if given), and only builds it on a miss.
+    """
+    fingerprint = logo_fingerprint(watermark_img)
+    key = (fingerprint, target_w, opacity)
+
+    variant = _logo_variants.get(key)
+    if variant is not None:
+        _logo_variants.move_to_end(key)
+        LOGO_CACHE_STATS["hits"] += 1
+        return variant
+
+    disk_path = None
+    if cache_dir:
+        disk_path = os.path.join(cache_dir, f"logo_{fingerprint}_w{target_w}_o{opacity}.png")
+        if os.path.exists(disk_path):
+            try:
+                with Image.open(disk_path) as cached:
+                    variant = cached.convert("RGBA")
+                LOGO_CACHE_STATS["disk_hits"] += 1
+            except Exception:
+                variant = None
+
+    if variant is None:
+        start = time.perf_counter()
+        variant = build_logo_variant(watermark_img, target_w, opacity)
+        LOGO_CACHE_STATS["build_seconds"] += time.perf_counter() - start
+        LOGO_CACHE_STATS["misses"] += 1
+
+        if disk_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                # Write to a temp name first so a crash never leaves a half-written PNG
+                tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+                variant.save(tmp_path, "PNG")
+                os.replace(tmp_path, disk_path)
+            except Exception:
+                pass
+
+    _logo_variants[key] = variant
+    if len(_logo_variants) > LOGO_CACHE_SIZE:
+        _logo_variants.popitem(last=False)
+    return variant
+
+def logo_cache_summary():
+    """One-line hit/miss report, including a rough estimate of resize time saved."""
+    stats = LOGO_CACHE_STATS
+    hits = stats["hits"] + stats["disk_hits"]
+    avg_build = stats["build_seconds"] / stats["misses"] if stats["misses"] else 0.0
+    return (f"🗂️ Logo cache: {stats['hits']} hits, {stats['disk_hits']} disk hits, "
+            f"{stats['misses']} misses (~{hits * avg_build:.1f}s of resizing saved)")
+
+# --- REGION-OF-INTEREST COMPOSITING ---
+
+def composite_logo(base_image, logo, x_pos, y_pos):
+    """
+    Blends an RGBA logo onto base_image at (x_pos, y_pos) and returns an RGB image.
+    Only the logo's bounding box is converted to RGBA and composited, so there is no
+    full-size transparent layer. Pixels match a full-frame alpha_composite exactly.
+    RGB inputs are modified in place.
+    """
+    final = base_image if base_image.mode == "RGB" else base_image.convert("RGB")
+
+    # Clip the logo box to the image (negative padding can push it past an edge)
+    left, top = max(0, x_pos), max(0, y_pos)
+    right = min(final.width, x_pos + logo.width)
+    bottom = min(final.height, y_pos + logo.height)
+    if right <= left or bottom <= top:
+        return final
+
+    box = (left, top, right, bottom)
+    region = base_image.crop(box).convert("RGBA")
+    layer = Image.new("RGBA", region.size, (0, 0, 0, 0))
+    layer.paste(logo, (x_pos - left, y_pos - top), mask=logo)
+    region = Image.alpha_composite(region, layer)
+
+    final.paste(region.convert("RGB"), box)
+    return final
+
+# --- DOWNSCALE-AWARE LOADING ---
+# When the output is going to be shrunk to a target width anyway, don't keep (or for JPEGs,
+# don't even decode) the full-resolution pixels. JPEGs use draft() to decode at 1/2, 1/4 or
+# 1/8 scale inside libjpeg; other formats are shrunk with reduce() right after decoding.
+# The image is never reduced below target_width * DRAFT_REDUCING_GAP, so the final LANCZOS
+# resize still has enough detail to work with.
+DRAFT_REDUCING_GAP = 2.0
+
+LOAD_STATS = {"images": 0, "reduced": 0, "saved_bytes": 0, "load_seconds": 0.0}
+
+def _reducible(img):
+    """
+    img in a mode reduce() can average: palette images become RGB(A) (averaging palette
+    indices would be meaningless), 1-bit and 16/32-bit integer images become L.
+    16-bit samples are scaled down to 8 bits; a plain convert("L") would clamp them to white.
+    """
+    if img.mode in ("P", "PA"):
+        has_alpha = img.mode == "PA" or "transparency" in img.info
+        return img.convert("RGBA" if has_alpha else "RGB")
+    if img.mode == "1":
+        return img.convert("L")
+    if img.mode.startswith("I"):
+        wide = img if img.mode == "I" else img.convert("I")
+        # I;16 is always 16-bit; a 32-bit I image only needs scaling if it holds 16-bit data
+        if img.mode != "I" or wide.getextrema()[1] > 255:
+            wide = wide.point(lambda v: v / 256)
+        return wide.convert("L")
+    return img
+
+def open_for_width(image_path, target_width, reducing_gap=DRAFT_REDUCING_GAP):
+    """
+    Opens and loads image_path, decoding it as small as a later resize to target_width allows.
+    Returns (img, stats). stats holds the "original" and "decoded" sizes, the
+    "saved_bytes" of pixel buffer that were never kept, "load_seconds" and "method".
+    """
+    start = time.perf_counter()
+    img = Image.open(image_path)
+    original_size = img.size
+    keep_width = target_width * reducing_gap
+    method = "full"
+
+    if img.width > keep_width:
+        if img.format == "JPEG":
+            scale = img.width / keep_width
+            img.draft(img.mode, (int(img.width / scale), int(img.height / scale)))
+            if img.size != original_size:
+                method = "draft"
+        img.load()
+        factor = int(img.width // keep_width)
+        if factor >= 2:
+            reducible = _reducible(img)
+            if reducible is not img:
+                img.close()
+                img = reducible
+            reduced = img.reduce(factor)
+            img.close()
+            img = reduced
+            method = "draft+reduce" if method == "draft" else "reduce"
+    else:
+        img.load()
+
+    bands = len(img.getbands())
+    saved_bytes = (original_size[0] * original_size[1] - img.width * img.height) * bands
+    stats = {
+        "original": original_size,
+        "decoded": img.size,
+        "saved_bytes": saved_bytes,
+        "load_seconds": time.perf_counter() - start,
+        "method": method,
+    }
+
+    LOAD_STATS["images"] += 1
+    LOAD_STATS["load_seconds"] += stats["load_seconds"]
+    if method != "full":
+        LOAD_STATS["reduced"] += 1
+        LOAD_STATS["saved_bytes"] += saved_bytes
+    return img, stats
+
+def format_load_stats(stats):
+    """Per-image line, e.g. 'draft: 7680x4320 -> 3840x2160 (-71.2 MB, 0.18s)'."""
+    (ow, oh), (dw, dh) = stats["original"], stats["decoded"]
+    return (f"{stats['method']}: {ow}x{oh} -> {dw}x{dh} "
+            f"(-{stats['saved_bytes'] / (1024 * 1024):.1f} MB, {stats['load_seconds']:.2f}s)")
+
+def load_stats_summary():
+    stats = LOAD_STATS
+    return (f"📉 Reduced decode: {stats['reduced']}/{stats['images']} images, "
+            f"{stats['saved_bytes'] / (1024 * 1024):.1f} MB of pixels never kept, "
+            f"{stats['load_seconds']:.1f}s spent loading")
+
+# --- CROSS-PROCESS COUNTERS ---
+
+def snapshot_stats():
+    """Counters of this process, for sending back from a pool worker."""
+    return {"logo": dict(LOGO_CACHE_STATS), "load": dict(LOAD_STATS)}
+
+def merge_stats(snapshot):
+    """Adds a worker's snapshot_stats() to this process's counters."""
+    for key, value in snapshot["logo"].items():
+        LOGO_CACHE_STATS[key] += value
+    for key, value in snapshot["load"].items():
+        LOAD_STATS[key] += value
+
+# --- LOOK-AHEAD PREPARATION ---
+# Per-image CPU work (the schedulers' optimize / hash-wash step) runs in a process pool a few
+# images ahead of the caller, so it overlaps with whatever the caller does per image
+# (caption API calls, CSV rows). Results still come back strictly in input order.
+PREP_WORKERS = 4      # Worker processes
+PREP_LOOKAHEAD = 8    # Images queued or running ahead of the one being consumed
+
+def prepare_ahead(func, paths, workers=PREP_WORKERS, lookahead=PREP_LOOKAHEAD):
+    """
+    Yields func(path) for every path, in order. A call that raised yields its exception
+    instead. func must be a module-level function (it is pickled to the workers).
+    workers <= 1 runs everything inline.
+    """
+    paths = list(paths)
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            try:
+                yield func(path)
+            except Exception as e:
+                yield e
+        return
+
+    with multiprocessing.Pool(min(workers, len(paths))) as pool:
+        remaining = iter(paths)
+        pending = deque(pool.apply_async(func, (path,)) for path in islice(remaining, max(1, lookahead)))
+        while pending:
+            result = pending.popleft()
+            # Top the window up before waiting, so the workers never run dry
+            for path in islice(remaining, 1):
+                pending.append(pool.apply_async(func, (path,)))
+            try:
+                value = result.get()
+            except Exception as e:
+                value = e
+            yield value
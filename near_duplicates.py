@@ -0,0 +1,127 @@
+import os
+import sqlite3
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# --- PERCEPTUAL NEAR-DUPLICATE INDEX ---
+# The exact content hash misses the same picture re-exported as PNG vs JPEG, recompressed
+# or resized. A dHash (brightness gradients of a 9x8 grayscale thumbnail, 64 bits) survives
+# all of those, and near-identical images differ in only a few bits. Every accepted image's
+# dHash is kept in SQLite and looked up through a multi-index hash table: the 64 bits are
+# split into 4 segments of 16, and anything within d bits must match some segment within
+# d // 4 bits, so only a handful of buckets are probed however long the history gets.
+# Used by auto_scheduler.py and auto_scheduler_waifu.py.
+DHASH_SIZE = 8          # 8 -> 64-bit hashes
+DHASH_WORKERS = 8       # Parallel thumbnail decodes (PIL releases the GIL while decoding)
+INDEX_SEGMENTS = 4      # 64-bit hashes -> 4 x 16-bit lookup tables
+
+def dhash(image_path, size=DHASH_SIZE):
+    """64-bit difference hash of an image as an int, or None if it can't be read."""
+    try:
+        with Image.open(image_path) as img:
+            # JPEGs decode straight at 1/2..1/8 scale; the thumbnail is tiny anyway
+            img.draft("L", (size * 8, size * 8))
+            pixels = list(img.convert("L").resize((size + 1, size), Image.Resampling.BOX).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            value = (value << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return value
+
+def dhash_many(image_paths, workers=DHASH_WORKERS):
+    """{path: dhash or None} computed on a thread pool."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(image_paths, pool.map(dhash, image_paths)))
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _segment_probes(segment, bits, radius):
+    """segment plus every value within radius flipped bits of it."""
+    probes = [segment]
+    for flips in range(1, radius + 1):
+        for positions in combinations(range(bits), flips):
+            probe = segment
+            for position in positions:
+                probe ^= 1 << position
+            probes.append(probe)
+    return probes
+
+class NearDuplicateIndex:
+    """
+    SQLite table images(name, hash) plus INDEX_SEGMENTS in-memory tables of
+    segment value -> names, rebuilt on open (tens of thousands of rows load in milliseconds).
+    """
+
+    def __init__(self, path, segments=INDEX_SEGMENTS):
+        self.segments = segments
+        self.segment_bits = DHASH_SIZE * DHASH_SIZE // segments
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS images (name TEXT PRIMARY KEY, hash INTEGER NOT NULL)")
+        self.hashes = {}
+        self.tables = [{} for _ in range(segments)]
+        for name, value in self.conn.execute("SELECT name, hash FROM images"):
+            self._index(name, value & ((1 << 64) - 1))
+        self.checked = 0
+        self.candidates = 0
+        self.found = 0
+
+    @property
+    def known(self):
+        return self.hashes.keys()
+
+    def _split(self, value):
+        mask = (1 << self.segment_bits) - 1
+        return [(value >> (i * self.segment_bits)) & mask for i in range(self.segments)]
+
+    def _index(self, name, value):
+        self.hashes[name] = value
+        for table, segment in zip(self.tables, self._split(value)):
+            table.setdefault(segment, []).append(name)
+
+    def add(self, name, value):
+        """Records an accepted image. name is its stable id (e.g. 'twitter_img_012')."""
+        if name in self.hashes or value is None:
+            return
+        self.conn.execute("INSERT INTO images (name, hash) VALUES (?, ?)", (name, _to_signed(value)))
+        self._index(name, value)
+
+    def find(self, value, max_distance):
+        """Closest indexed image within max_distance bits: (name, distance), or None."""
+        self.checked += 1
+        if value is None or not self.hashes:
+            return None
+        seen = set()
+        best = None
+        radius = max_distance // self.segments
+        for table, segment in zip(self.tables, self._split(value)):
+            for probe in _segment_probes(segment, self.segment_bits, radius):
+                for name in table.get(probe, ()):
+                    if name in seen:
+                        continue
+                    seen.add(name)
+                    dist = hamming(value, self.hashes[name])
+                    if dist <= max_distance and (best is None or dist < best[1]):
+                        best = (name, dist)
+        self.candidates += len(seen)
+        if best is not None:
+            self.found += 1
+        return best
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def summary(self):
+        per_check = self.candidates / self.checked if self.checked else 0
+        return (f"🧬 Near-duplicate index: {len(self.hashes)} images, {self.checked} checked "
+                f"({per_check:.1f} candidates compared each), {self.found} near-duplicates")
@@ -0,0 +1,108 @@
+import os
+import sys
+import random
+import argparse
+import tempfile
+
+from censor_tool import INPUT_FOLDER, IMAGE_EXTENSIONS, QUANTIZED_MODEL_FILE, default_model_file
+from file_scanner import iter_image_entries
+
+# --- INT8 QUANTIZATION FOR CENSOR_TOOL ---
+# Writes an int8 copy of NudeNet's 320n.onnx for CPU-only hosts (censor_tool.py --int8).
+# "static" calibrates activation ranges on a sample of your own images (best speed);
+# "dynamic" needs no images but only quantizes weights ahead of time.
+# Check the result with benchmarks/bench_censor_model.py before switching over.
+CALIBRATION_IMAGES = 64   # Random sample from the calibration folder
+
+def find_images(folder, limit):
+    paths = [entry.path for _, entry in iter_image_entries(folder, IMAGE_EXTENSIONS) if entry is not None]
+    random.Random(0).shuffle(paths)
+    return paths[:limit]
+
+def head_nodes(model_path):
+    """
+    Post-processing nodes of the YOLOv8 detection head (everything in the module that produces
+    the output except its Convs, plus the DFL box decoding). The output packs pixel coordinates
+    (0-320) and class scores (0-1) into one tensor, so an int8 scale there flattens every
+    score to zero. These stay in float; the backbone and head Convs are still quantized.
+    """
+    import onnx
+
+    graph = onnx.load(model_path).graph
+    output_names = {output.name for output in graph.output}
+    producer = next(node for node in graph.node if output_names & set(node.output))
+    head = producer.name.rsplit("/", 1)[0] + "/"
+    return [node.name for node in graph.node
+            if node.name.startswith(head) and (node.op_type != "Conv" or "/dfl/" in node.name)]
+
+def quantize(method, images_folder, output_path, count):
+    try:
+        from onnxruntime.quantization import (
+            CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static)
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+    except ImportError:
+        print("❌ Quantization needs the onnx package: pip install onnx")
+        return False
+    import onnxruntime
+    from nudenet.nudenet import _read_image
+
+    source = default_model_file()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference + constant folding first, as recommended before quantizing
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(source, prepared, skip_symbolic_shape=True)
+
+        if method == "dynamic":
+            quantize_dynamic(prepared, output_path, weight_type=QuantType.QInt8,
+                             nodes_to_exclude=head_nodes(prepared))
+        else:
+            paths = find_images(images_folder, count)
+            if not paths:
+                print(f"❌ No calibration images in {images_folder} (or use --method dynamic)")
+                return False
+            print(f"📐 Calibrating on {len(paths)} images from {images_folder}")
+            input_name = onnxruntime.InferenceSession(source).get_inputs()[0].name
+
+            class ImageReader(CalibrationDataReader):
+                """Feeds images through NudeNet's own preprocessing, one at a time."""
+
+                def __init__(self):
+                    self.remaining = iter(paths)
+
+                def get_next(self):
+                    for path in self.remaining:
+                        try:
+                            return {input_name: _read_image(path, 320)[0]}
+                        except Exception:
+                            continue  # Unreadable image: skip it
+                    return None
+
+            quantize_static(prepared, output_path, ImageReader(),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            nodes_to_exclude=head_nodes(prepared),
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    size_before = os.path.getsize(source) / (1024 * 1024)
+    size_after = os.path.getsize(output_path) / (1024 * 1024)
+    print(f"✅ Wrote {output_path} ({size_before:.1f} MB -> {size_after:.1f} MB)")
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write an int8-quantized NudeNet model for censor_tool.py --int8.")
+    parser.add_argument("--method", choices=("static", "dynamic"), default="static",
+                        help="static = calibrated on local images (default), dynamic = weights only")
+    parser.add_argument("--images", default=INPUT_FOLDER,
+                        help="Calibration image folder, searched recursively (default: censor_data/input)")
+    parser.add_argument("--count", type=int, default=CALIBRATION_IMAGES,
+                        help=f"Calibration images to use (default: {CALIBRATION_IMAGES})")
+    parser.add_argument("--output", default=QUANTIZED_MODEL_FILE,
+                        help="Where to write the model (default: censor_data/320n.int8.onnx)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("--- 🧮 NudeNet int8 Quantization ---")
+    if not quantize(args.method, args.images, args.output, args.count):
+        sys.exit(1)
@@ -0,0 +1,97 @@
+import os
+import csv
+import json
+import datetime
+
+# --- RESUMABLE CSV RUNS ---
+# The schedulers rename files and move .sequence_id / .last_date forward before the CSV is
+# done, so a crash halfway used to leave a truncated CSV and no way back. Now every run
+# writes its plan and then one line per finished row to OUTPUT_CSV + ".journal" (flushed
+# and fsynced), and the CSV itself is only written at the end, atomically. If a journal is
+# still there on the next start, that run is finished first instead of starting a new one.
+# Used by auto_scheduler.py and auto_scheduler_waifu.py.
+
+class RunJournal:
+    """
+    Append-only JSON lines: {"plan": [...], "start": iso} first, then one
+    {"row": [...] or null, "next": iso, ...extra} per plan entry, in plan order.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.path = csv_path + ".journal"
+        self.plan = []
+        self.start = None
+        self.entries = []
+
+    def load(self):
+        """Reads an unfinished run's journal. False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break  # Torn last line from the crash: that row wasn't committed
+        if not records or "plan" not in records[0]:
+            return False
+        if len(records) < len(lines):
+            # Drop the torn line so rows appended from now on stay readable
+            with open(self.path, "w", encoding="utf-8") as f:
+                for record in records:
+                    self._write(f, record)
+        self.plan = records[0]["plan"]
+        self.start = datetime.datetime.fromisoformat(records[0]["start"])
+        self.entries = records[1:]
+        return True
+
+    def begin(self, plan, start):
+        self.plan = [list(item) for item in plan]
+        self.start = start
+        self.entries = []
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            self._write(f, {"plan": self.plan, "start": start.isoformat()})
+
+    def pending(self):
+        """Plan entries that have no committed row yet."""
+        return [tuple(item) for item in self.plan[len(self.entries):]]
+
+    def next_slot(self):
+        """Schedule baseline for the next row (the run's start, or after the last committed row)."""
+        for entry in reversed(self.entries):
+            if entry.get("next"):
+                return datetime.datetime.fromisoformat(entry["next"])
+        return self.start
+
+    def commit(self, row, next_slot, **extra):
+        """Records the plan's next entry as done. row=None for an image that was skipped."""
+        entry = {"row": row, "next": next_slot.isoformat() if next_slot else None}
+        entry.update(extra)
+        with open(self.path, "a", encoding="utf-8") as f:
+            self._write(f, entry)
+        self.entries.append(entry)
+
+    def finalize(self, headers):
+        """Writes the CSV to a temp file, swaps it in with os.replace, then drops the journal."""
+        temp_path = self.csv_path + ".tmp"
+        os.makedirs(os.path.dirname(self.csv_path) or ".", exist_ok=True)
+        # 1. UTF-8-SIG for correct Emoji display
+        # 2. QUOTE_MINIMAL keeps the file cleaner (closer to the example), quoting only when necessary
+        with open(temp_path, mode='w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.writer(file, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(headers)
+            writer.writerows(entry["row"] for entry in self.entries if entry["row"] is not None)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.csv_path)
+        os.remove(self.path)
+
+    @staticmethod
+    def _write(f, record):
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
@@ -1,6 +1,13 @@
 import os
+import json
+import hashlib
+import argparse
+import multiprocessing
 from PIL import Image
 from tqdm import tqdm
+from image_utils import get_logo_variant, logo_cache_summary, composite_logo
+from image_utils import open_for_width, load_stats_summary, snapshot_stats, merge_stats
+from file_scanner import iter_jobs, IMAGE_EXTENSIONS
 
 # --- CONFIGURATION ---
 # Base directory is where this script runs (root/)
@@ -21,42 +28,197 @@ OPACITY = 215       # Transparency (0=invisible, 255=solid) - fully opaque (alre
 PADDING_X = 15      # Pixel distance from right edge
 PADDING_Y = -10       # Pixel distance from bottom edge (smaller = lower position)
 
-def add_logo_watermark(image_path, output_path, watermark_img):
-    try:
-        base_image = Image.open(image_path).convert("RGBA")
-        base_w, base_h = base_image.size
+# Optional downscale before watermarking (None = keep the original resolution).
+# Oversized sources are then decoded straight to near this width instead of at full size.
+MAX_OUTPUT_WIDTH = None
+
+# Resized logos are reused across images of the same width.
+# Set to None to keep the cache in memory only (no reuse between runs).
+LOGO_CACHE_DIR = os.path.join(BASE_DIR, "watermark_data", ".logo_cache")
 
-        # 1. Calculate new Logo Size (Proportional)
-        logo_aspect = watermark_img.width / watermark_img.height
-        new_logo_w = int(base_w * LOGO_SCALE)
-        new_logo_h = int(new_logo_w / logo_aspect)
+# Incremental runs: inputs whose size/mtime and watermark settings are unchanged since
+# their last successful run (and whose output still exists) are skipped.
+MANIFEST_FILE = os.path.join(BASE_DIR, "watermark_data", ".manifest.json")
+MANIFEST_SAVE_EVERY = 500   # Flush the manifest to disk every N finished images
 
-        # 2. Resize the Watermark
-        resized_logo = watermark_img.resize((new_logo_w, new_logo_h), Image.Resampling.LANCZOS)
+def render_watermark(image_path, output_path, watermark_img):
+    """Watermarks one image and saves it as JPG. Raises on failure."""
+    if MAX_OUTPUT_WIDTH:
+        base_image, load_stats = open_for_width(image_path, MAX_OUTPUT_WIDTH)
+        orig_w, orig_h = load_stats["original"]
+        if orig_w > MAX_OUTPUT_WIDTH:
+            new_h = int(MAX_OUTPUT_WIDTH * orig_h / orig_w)
+            base_image = base_image.resize((MAX_OUTPUT_WIDTH, new_h), Image.Resampling.LANCZOS)
+    else:
+        base_image = Image.open(image_path)
+    base_w, base_h = base_image.size
 
-        # 3. Adjust Opacity
-        if OPACITY < 255:
-            r, g, b, alpha = resized_logo.split()
-            alpha = alpha.point(lambda p: p * (OPACITY / 255))
-            resized_logo = Image.merge("RGBA", (r, g, b, alpha))
+    # 1-3. Resized + opacity-adjusted logo (cached per width)
+    new_logo_w = int(base_w * LOGO_SCALE)
+    resized_logo = get_logo_variant(watermark_img, new_logo_w, OPACITY, LOGO_CACHE_DIR)
+    new_logo_h = resized_logo.height
 
-        # 4. Calculate Position (Bottom Right)
-        x_pos = base_w - new_logo_w - PADDING_X
-        y_pos = base_h - new_logo_h - PADDING_Y
+    # 4. Calculate Position (Bottom Right)
+    x_pos = base_w - new_logo_w - PADDING_X
+    y_pos = base_h - new_logo_h - PADDING_Y
 
-        # 5. Paste & Composite
-        transparent_layer = Image.new("RGBA", base_image.size, (0, 0, 0, 0))
-        transparent_layer.paste(resized_logo, (x_pos, y_pos), mask=resized_logo)
-        final = Image.alpha_composite(base_image, transparent_layer)
+    # 5. Composite (logo region only, result is RGB)
+    final = composite_logo(base_image, resized_logo, x_pos, y_pos)
 
-        # 6. Save as JPG with corrected extension
-        # Force .jpg extension regardless of input format
-        output_path = os.path.splitext(output_path)[0] + ".jpg"
-        final.convert("RGB").save(output_path, "JPEG", quality=95)
+    # 6. Save as JPG with corrected extension
+    # Force .jpg extension regardless of input format
+    output_path = os.path.splitext(output_path)[0] + ".jpg"
+    final.save(output_path, "JPEG", quality=95)
 
+def add_logo_watermark(image_path, output_path, watermark_img):
+    try:
+        render_watermark(image_path, output_path, watermark_img)
+        return True
     except Exception as e:
         # Use tqdm.write to avoid breaking progress bar
         tqdm.write(f"❌ Error processing {os.path.basename(image_path)}: {e}")
+        return False
+
+# --- INCREMENTAL MANIFEST ---
+
+def settings_fingerprint():
+    """Hash of everything that changes the output: placement settings + the logo file itself."""
+    digest = hashlib.sha1()
+    settings = {"LOGO_SCALE": LOGO_SCALE, "OPACITY": OPACITY, "PADDING_X": PADDING_X, "PADDING_Y": PADDING_Y}
+    if MAX_OUTPUT_WIDTH:
+        # Only included when set, so existing manifests stay valid
+        settings["MAX_OUTPUT_WIDTH"] = MAX_OUTPUT_WIDTH
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    with open(WATERMARK_FILE, "rb") as f:
+        digest.update(hashlib.md5(f.read()).digest())
+    return digest.hexdigest()[:16]
+
+def load_manifest():
+    if os.path.exists(MANIFEST_FILE):
+        try:
+            with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            print("⚠️ Manifest unreadable, starting fresh.")
+    return {}
+
+def save_manifest(manifest):
+    # Write to a temp file and swap it in so an interrupted save can't corrupt the manifest
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+class Manifest:
+    """
+    Maps each source (relative to INPUT_FOLDER) to the size, mtime and settings hash
+    it was last watermarked with, plus its output (relative to OUTPUT_FOLDER).
+    """
+
+    def __init__(self, settings_hash, force=False):
+        self.settings_hash = settings_hash
+        self.entries = {} if force else load_manifest()
+        self.stamps = {}
+        self.unsaved = 0
+        self.skipped = 0
+
+    def filter_pending(self, jobs):
+        """Returns only the jobs whose input or settings changed since the last run."""
+        pending = []
+        for in_path, out_path in jobs:
+            stat = os.stat(in_path)
+            key = os.path.relpath(in_path, INPUT_FOLDER)
+            entry = self.entries.get(key)
+            if (entry is not None
+                    and entry["size"] == stat.st_size
+                    and entry["mtime_ns"] == stat.st_mtime_ns
+                    and entry["settings"] == self.settings_hash
+                    and os.path.exists(os.path.join(OUTPUT_FOLDER, entry["output"]))):
+                continue
+            self.stamps[in_path] = (stat.st_size, stat.st_mtime_ns)
+            pending.append((in_path, out_path))
+
+        self.skipped += len(jobs) - len(pending)
+        if self.skipped:
+            print(f"⏭️ Skipping {self.skipped} unchanged images (use --force to redo them)")
+        return pending
+
+    def record(self, in_path, out_path):
+        size, mtime_ns = self.stamps.pop(in_path)
+        self.entries[os.path.relpath(in_path, INPUT_FOLDER)] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "settings": self.settings_hash,
+            "output": os.path.relpath(out_path, OUTPUT_FOLDER),
+        }
+        self.unsaved += 1
+        if self.unsaved >= MANIFEST_SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        if self.unsaved:
+            save_manifest(self.entries)
+            self.unsaved = 0
+
+# --- PARALLEL WORKERS ---
+# The logo is handed to each worker once via the pool initializer,
+# so tasks only carry (in_path, out_path).
+_worker_logo = None
+
+def _init_worker(watermark_img):
+    global _worker_logo
+    _worker_logo = watermark_img
+
+def _watermark_job(job):
+    """
+    Runs in a worker process.
+    Returns (job, error message or None, worker pid, worker's cache/load counters).
+    """
+    in_path, out_path = job
+    error = None
+    try:
+        render_watermark(in_path, out_path, _worker_logo)
+    except Exception as e:
+        error = str(e)
+    return job, error, os.getpid(), snapshot_stats()
+
+def run_jobs(jobs, watermark_source, workers=1, manifest=None):
+    """
+    Watermarks a list of (in_path, out_path) jobs behind a single progress bar.
+    workers > 1 spreads the jobs over a process pool; errors are reported back here.
+    Successful jobs are recorded in the manifest (if given).
+    """
+    if manifest is not None:
+        jobs = manifest.filter_pending(jobs)
+        if not jobs:
+            return 0
+
+    count = 0
+    with tqdm(total=len(jobs), desc="Watermarking", unit="img", ncols=80) as pbar:
+        if workers <= 1:
+            for in_path, out_path in jobs:
+                if add_logo_watermark(in_path, out_path, watermark_source) and manifest is not None:
+                    manifest.record(in_path, out_path)
+                count += 1
+                pbar.update(1)
+        else:
+            chunksize = max(1, min(16, len(jobs) // (workers * 8)))
+            worker_stats = {}
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(watermark_source,)) as pool:
+                for (in_path, out_path), error, pid, stats in pool.imap_unordered(_watermark_job, jobs, chunksize=chunksize):
+                    if error:
+                        tqdm.write(f"❌ Error processing {os.path.basename(in_path)}: {error}")
+                    elif manifest is not None:
+                        manifest.record(in_path, out_path)
+                    worker_stats[pid] = stats
+                    count += 1
+                    pbar.update(1)
+            for stats in worker_stats.values():
+                merge_stats(stats)
+
+    if manifest is not None:
+        manifest.save()
+    return count
 
 def detect_mode(input_folder):
     """
@@ -73,89 +235,50 @@ def detect_mode(input_folder):
     except Exception:
         return 'flat'
 
-def process_flat_mode(watermark_source):
+def process_flat_mode(watermark_source, workers=1, manifest=None):
     """
     Flat mode: Process images directly in input folder.
     Backwards compatible with original behavior.
     """
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
+    # Add _wm suffix before extension
+    jobs = list(iter_jobs(INPUT_FOLDER, OUTPUT_FOLDER, "_wm", IMAGE_EXTENSIONS, out_ext=".jpg", recursive=False))
     
-    if not files:
+    if not jobs:
         print(f"⚠️ No images found in: {INPUT_FOLDER}")
         return 0
 
-    print(f"🚀 Processing {len(files)} images (Flat Mode)...")
+    print(f"🚀 Processing {len(jobs)} images (Flat Mode)...")
     
-    count = 0
-    for filename in tqdm(files, desc="Watermarking", unit="img", ncols=80):
-        in_path = os.path.join(INPUT_FOLDER, filename)
-        # Add _wm suffix before extension
-        name_without_ext = os.path.splitext(filename)[0]
-        out_filename = f"{name_without_ext}_wm.jpg"
-        out_path = os.path.join(OUTPUT_FOLDER, out_filename)
-        add_logo_watermark(in_path, out_path, watermark_source)
-        count += 1
+    return run_jobs(jobs, watermark_source, workers, manifest)
 
-    return count
-
-def process_recursive_mode(watermark_source):
+def process_recursive_mode(watermark_source, workers=1, manifest=None):
     """
     Recursive mode: Preserve folder structure with _wm suffix on folders.
-    Walks through all subdirectories and processes images while maintaining structure.
+    Scans all subdirectories once and processes images while maintaining structure.
     """
-    # First, count total images for progress bar
-    total_images = 0
-    for root, dirs, files in os.walk(INPUT_FOLDER):
-        image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
-        total_images += len(image_files)
+    # Add _wm suffix to the top-level folder and to each filename
+    jobs = list(iter_jobs(INPUT_FOLDER, OUTPUT_FOLDER, "_wm", IMAGE_EXTENSIONS, out_ext=".jpg"))
     
-    if total_images == 0:
+    if not jobs:
         print(f"⚠️ No images found in subdirectories")
         return 0
     
-    print(f"🚀 Processing {total_images} images across folders (Recursive Mode)...")
+    print(f"🚀 Processing {len(jobs)} images across folders (Recursive Mode)...")
     
-    count = 0
-    # Create progress bar
-    with tqdm(total=total_images, desc="Watermarking", unit="img", ncols=80) as pbar:
-        # Walk through all subdirectories in input folder
-        for root, dirs, files in os.walk(INPUT_FOLDER):
-            # Calculate relative path from input folder
-            rel_path = os.path.relpath(root, INPUT_FOLDER)
-            
-            # Skip if we're at the root level (no subdirectories to process)
-            if rel_path == '.':
-                continue
-            
-            # Split the relative path to add _wm suffix to the top-level folder
-            path_parts = rel_path.split(os.sep)
-            if len(path_parts) > 0:
-                # Add _wm suffix to the top-level folder only
-                path_parts[0] = path_parts[0] + '_wm'
-            
-            # Reconstruct the output path
-            output_rel_path = os.sep.join(path_parts)
-            output_dir = os.path.join(OUTPUT_FOLDER, output_rel_path)
-            
-            # Create output directory structure
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Process all image files in this directory
-            image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
-            
-            for filename in image_files:
-                in_path = os.path.join(root, filename)
-                # Add _wm suffix to filename before extension
-                name_without_ext = os.path.splitext(filename)[0]
-                out_filename = f"{name_without_ext}_wm.jpg"
-                out_path = os.path.join(output_dir, out_filename)
-                add_logo_watermark(in_path, out_path, watermark_source)
-                count += 1
-                pbar.update(1)
-    
-    return count
+    return run_jobs(jobs, watermark_source, workers, manifest)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add the logo watermark to every image in watermark_data/input.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parallel worker processes (0 = one per CPU core, default: 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the manifest and re-watermark every image")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
     print("--- 🌊 Watermark Tool Starting ---")
     
     # Auto-create folders if they don't exist
@@ -179,18 +302,27 @@ def main():
         print(f"❌ Error loading watermark image: {e}")
         return
 
+    manifest = Manifest(settings_fingerprint(), force=args.force)
+
     # Auto-detect mode
     mode = detect_mode(INPUT_FOLDER)
     print(f"📂 Mode detected: {mode.upper()}")
+    if workers > 1:
+        print(f"⚙️ Workers: {workers}")
     
     # Process based on detected mode
     if mode == 'flat':
-        count = process_flat_mode(watermark_source)
+        count = process_flat_mode(watermark_source, workers, manifest)
     else:  # recursive
-        count = process_recursive_mode(watermark_source)
+        count = process_recursive_mode(watermark_source, workers, manifest)
     
     if count > 0:
         print(f"\n✨ SUCCESS! {count} images watermarked and saved to: watermark_data/output/")
+        print(logo_cache_summary())
+        if MAX_OUTPUT_WIDTH:
+            print(load_stats_summary())
+    elif manifest.skipped:
+        print(f"\n✅ Everything is already up to date.")
     else:
         print(f"\n⚠️ No images were processed.")
 